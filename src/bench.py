@@ -0,0 +1,211 @@
+"""
+Simulation throughput benchmarks.
+
+Each scenario runs in a fresh process so that peak RSS is not polluted by
+earlier scenarios. Results are written as JSON so runs from different commits
+can be compared with --compare.
+
+    python bench.py --output before.json
+    python bench.py --output after.json --compare before.json
+
+--memory instead measures the bytes held per job (with its patient) and per
+machine or operator, by building that many of each under tracemalloc.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+
+from config import Config
+from environment import Environment
+from job import Job, Patient
+from machine import HarvestMachine, ProcessMachine
+from op import HarvestOperator, ProcessOperator
+from streams import RandomStreams
+
+
+Scenario = namedtuple('Scenario', ['name', 'config'])
+
+
+def scaled(patient_count: int) -> Config:
+    config = Config()
+    config.patient_count = patient_count
+    # Arrivals are 2-4 hours apart, so this horizon admits the whole cohort
+    config.simulation_time = 3 * patient_count
+    return config
+
+
+def scenarios(max_patients: int) -> list[Scenario]:
+    stressed = scaled(1000)
+    stressed.patient_config.set_patient_rates(2, 4, 4)
+    result = [
+        Scenario('default', Config()),
+        Scenario('stressed_rates', stressed),
+    ]
+    count = 100
+    while count <= max_patients:
+        result.append(Scenario(f"patients_{count}", scaled(count)))
+        count *= 10
+    for machines, operators in [(2, 1), (8, 4), (16, 8)]:
+        config = scaled(1000) \
+            .set_harvest_machine_count(machines) \
+            .set_process_machine_count(2 * machines) \
+            .set_harvest_operator_count(operators) \
+            .set_process_operator_count(2 * operators)
+        result.append(Scenario(f"resources_{machines}m_{operators}o", config))
+    return result
+
+
+def run_scenario(config: Config, seed: int) -> dict:
+    blocks_before = sys.getallocatedblocks()
+    start = time.perf_counter()
+    env = Environment(config, np.random.default_rng(seed))
+    env.simulate()
+    wall = time.perf_counter() - start
+    blocks = sys.getallocatedblocks() - blocks_before
+
+    events = max(env.event_count, 1)
+    hours = max(float(env.clock), 1e-9)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss_scale = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'events': env.event_count,
+        'simulated_hours': float(env.clock),
+        'wall_seconds': wall,
+        'events_per_second': env.event_count / wall,
+        'wall_seconds_per_simulated_hour': wall / hours,
+        'peak_rss_bytes':
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * rss_scale,
+        # Net Python memory blocks still allocated after the run
+        'retained_blocks_per_event': blocks / events,
+    }
+
+
+def allocated_bytes(build) -> tuple[int, object]:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, built
+
+
+def memory_footprint(count: int, seed: int) -> dict:
+    """Bytes per job and per resource, averaged over count of each"""
+    config = Config()
+    streams = RandomStreams(np.random.default_rng(seed))
+    # Draw the patients' random values up front so that the generators'
+    # buffers are not counted against the jobs
+    patients = streams.patients
+    patients.take(1)
+
+    job_bytes, jobs = allocated_bytes(lambda: [
+        Job(Patient.random(config.patient_config, patients), i)
+        for i in range(count)])
+    del jobs
+
+    result = {'patients': count, 'bytes_per_job': job_bytes / count}
+    for name, cls in [('harvest_machine', HarvestMachine),
+                      ('process_machine', ProcessMachine),
+                      ('harvest_operator', HarvestOperator),
+                      ('process_operator', ProcessOperator)]:
+        size, resources = allocated_bytes(
+            lambda: [cls(i) for i in range(count)])
+        del resources
+        result[f"bytes_per_{name}"] = size / count
+    return result
+
+
+def run_isolated(config: Config, seed: int) -> dict:
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        return pool.apply(run_scenario, (config, seed))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict) -> None:
+    old = baseline['scenarios']
+    print(f"{'scenario':<28} {'events/s':>12} {'baseline':>12} {'ratio':>7}")
+    for name, result in results['scenarios'].items():
+        if name not in old:
+            continue
+        now = result['events_per_second']
+        then = old[name]['events_per_second']
+        print(f"{name:<28} {now:>12.0f} {then:>12.0f} {now / then:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--max-patients', type=int, default=10 ** 4,
+                        help='largest scaled cohort (up to 10^6)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='keep the fastest of this many runs')
+    parser.add_argument('--only', help='run only scenarios containing this')
+    parser.add_argument('--output', help='write results as JSON here')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--memory', type=int, metavar='N', nargs='?',
+                        const=10 ** 6,
+                        help='measure memory per object over N objects '
+                        '(default 10^6) instead of throughput')
+    args = parser.parse_args()
+
+    if args.memory:
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(1) as pool:
+            result = pool.apply(memory_footprint, (args.memory, args.seed))
+        for name, value in result.items():
+            print(f"{name:<28} {value:>12.1f}")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'commit': git_commit(), 'memory': result}, f,
+                          indent=2)
+        return
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'seed': args.seed,
+        'scenarios': {},
+    }
+    for scenario in scenarios(args.max_patients):
+        if args.only and args.only not in scenario.name:
+            continue
+        runs = [run_isolated(scenario.config, args.seed)
+                for _ in range(args.repeat)]
+        best = max(runs, key=lambda r: r['events_per_second'])
+        results['scenarios'][scenario.name] = best
+        print(f"{scenario.name:<28} {best['events']:>10} events "
+              f"{best['events_per_second']:>12.0f} events/s "
+              f"{best['peak_rss_bytes'] / 2 ** 20:>8.1f} MiB",
+              flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,12 +5,66 @@ from collections import namedtuple
 Range = namedtuple('Range', ['low', 'high'])
 Rates = namedtuple('Rates', ['bad', 'average', 'good'])
 GenderedPair = namedtuple('GenderedPair', ['male', 'female'])
+# Mean time between failures and mean time to repair, in hours; both are
+# exponentially distributed
+Reliability = namedtuple('Reliability', ['mtbf', 'mttr'])
 
 
 class ConfigError(Exception):
     pass
 
 
+# Values of Config.patient_arrival_distribution
+# Integer gaps drawn uniformly from 2-4 hours
+ARRIVAL_UNIFORM = 0
+# Poisson arrivals with the same 3 hour mean gap
+ARRIVAL_EXPONENTIAL = 1
+ARRIVAL_DISTRIBUTIONS = [ARRIVAL_UNIFORM, ARRIVAL_EXPONENTIAL]
+
+# Environment queues whose service order is set by Config.queue_disciplines.
+# The job queues hold jobs awaiting an operator, the operator queues hold
+# operators (with their job) awaiting a machine.
+DISPATCH_QUEUES = ['harvest_operator_job_queue', 'process_operator_job_queue',
+                   'harvest_machine_operator_queue',
+                   'process_machine_operator_queue']
+
+
+def plain(value):
+    """Convert (nested) namedtuples to dicts, for serialization"""
+    if hasattr(value, '_asdict'):
+        return {k: plain(v) for k, v in value._asdict().items()}
+    return value
+
+
+def record(cls, value, field=None):
+    """
+    Build the namedtuple cls from a dict or sequence, as produced by plain()
+    or written in a config file. field(v) converts each member.
+    """
+    if field is None:
+        field = lambda v: v
+    if isinstance(value, dict):
+        unknown = set(value) - set(cls._fields)
+        if unknown or len(value) != len(cls._fields):
+            raise ConfigError(f"{cls.__name__} needs exactly the fields "
+                              f"{list(cls._fields)}, got {list(value)}")
+        return cls(**{k: field(v) for k, v in value.items()})
+    if len(value) != len(cls._fields):
+        raise ConfigError(f"{cls.__name__} needs {len(cls._fields)} values")
+    return cls(*(field(v) for v in value))
+
+
+def update(target, values: dict, records: dict) -> None:
+    """Set the attributes of target in values, converting records"""
+    for name, value in values.items():
+        if not hasattr(target, name):
+            raise ConfigError(f"{type(target).__name__} has no attribute "
+                              f"{name}")
+        if name in records:
+            value = records[name](value)
+        setattr(target, name, value)
+
+
 class PatientConfig:
     def __init__(self):
         self.conversion_factor = 140000
@@ -24,13 +78,28 @@ class PatientConfig:
         self.patient_rates = Rates(bad, average, good)
         return self
 
+    def to_dict(self) -> dict:
+        return {k: plain(v) for k, v in vars(self).items()}
+
+    @staticmethod
+    def from_dict(values: dict) -> PatientConfig:
+        """The defaults, overridden by values (in the form of to_dict())"""
+        pconfig = PatientConfig()
+        update(pconfig, values, {
+            'blood_vol_range': lambda v: record(
+                GenderedPair, v, lambda r: record(Range, r)),
+            'patient_rates': lambda v: record(Rates, v),
+        })
+        return pconfig
+
 
 class Config:
     def __init__(self):
-        self.patient_count = 20
+        # None admits patients until simulation_time
+        self.patient_count: int | None = 20
         self.simulation_time: int = 3000
         self.max_rework_count: int = 3
-        self.patient_arrival_distribution: int = 0
+        self.patient_arrival_distribution: int = ARRIVAL_UNIFORM
 
         self.patient_config = PatientConfig()
 
@@ -50,12 +119,84 @@ class Config:
 
         self.qc_reject_threshold_policy = 0.5
 
+        # Service order of each dispatch queue, by discipline name. See
+        # dispatch.DISCIPLINES.
+        self.queue_disciplines = {name: 'fifo' for name in DISPATCH_QUEUES}
+
+        # Machine breakdowns, as a Reliability per machine kind. None means
+        # the machines never fail.
+        self.harvest_machine_reliability: Reliability | None = None
+        self.process_machine_reliability: Reliability | None = None
+
+    def to_dict(self) -> dict:
+        result = {k: plain(v) for k, v in vars(self).items()}
+        result['patient_config'] = self.patient_config.to_dict()
+        return result
+
+    @staticmethod
+    def from_dict(values: dict) -> Config:
+        """
+        The defaults, overridden by values (in the form of to_dict()). Keys
+        left out keep their defaults, including inside patient_config and
+        queue_disciplines. A patient_count of false means None, for formats
+        without a null such as TOML.
+        """
+        values = dict(values)
+        config = Config()
+        if values.get('patient_count') is False:
+            values['patient_count'] = None
+        if 'patient_config' in values:
+            config.patient_config = PatientConfig.from_dict(
+                values.pop('patient_config'))
+        for queue, discipline in values.pop('queue_disciplines', {}).items():
+            config.set_queue_discipline(queue, discipline)
+        update(config, values, {
+            'manufacturing_duration_percentage': lambda v: record(Rates, v),
+            'slope': lambda v: record(Range, v),
+            'harvest_machine_reliability': lambda v: None if v is None
+            else record(Reliability, v),
+            'process_machine_reliability': lambda v: None if v is None
+            else record(Reliability, v),
+        })
+        if values.get('patient_arrival_distribution',
+                      ARRIVAL_UNIFORM) not in ARRIVAL_DISTRIBUTIONS:
+            raise ConfigError('unknown patient_arrival_distribution')
+        return config
+
     def set_mfg_dur_pct(self, bad: float, average: float, good: float) -> Config:
         if bad + average + good != 1.0:
             raise ConfigError
         self.manufacturing_duration_percentage = Rates(bad, average, good)
         return self
 
+    def set_patient_arrival_distribution(self, distribution: int) -> Config:
+        if distribution not in ARRIVAL_DISTRIBUTIONS:
+            raise ConfigError
+        self.patient_arrival_distribution = distribution
+        return self
+
+    def set_queue_discipline(self, queue: str, discipline: str) -> Config:
+        if queue not in DISPATCH_QUEUES:
+            raise ConfigError(f"no dispatch queue {queue}")
+        self.queue_disciplines = {**self.queue_disciplines, queue: discipline}
+        return self
+
+    def set_harvest_machine_reliability(self,
+                                        mtbf: float,
+                                        mttr: float) -> Config:
+        if mtbf <= 0 or mttr <= 0:
+            raise ConfigError
+        self.harvest_machine_reliability = Reliability(mtbf, mttr)
+        return self
+
+    def set_process_machine_reliability(self,
+                                        mtbf: float,
+                                        mttr: float) -> Config:
+        if mtbf <= 0 or mttr <= 0:
+            raise ConfigError
+        self.process_machine_reliability = Reliability(mtbf, mttr)
+        return self
+
     def set_slope(self, low: int, high: int) -> Config:
         self.slope = Range(low, high)
         return self
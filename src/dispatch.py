@@ -0,0 +1,77 @@
+"""
+Queue disciplines for the environment's dispatch queues.
+
+A discipline is a key function key(job, config). Jobs with lower keys are
+served first, and jobs with equal keys in arrival order. The 'fifo'
+discipline has no key and keeps the plain deque-backed Queue. Operator
+queues are ordered by their operator's job. Keys are module-level functions
+rather than closures so that environments stay picklable for snapshots.
+"""
+from __future__ import annotations
+
+from functools import partial
+from typing import Any, Callable
+
+from config import Config, ConfigError, DISPATCH_QUEUES
+from job import Job
+from op import Operator
+from util import Queue, PriorityQueue
+
+
+JobKey = Callable[[Job, Config], Any]
+
+
+def expected_process_time(job: Job, config: Config) -> float:
+    """Mean of Job.calculate_process_duration, in hours"""
+    target_low, target_high, target_zero = job.targets(config)
+    bad, average, good = config.manufacturing_duration_percentage
+    days = bad * target_low / 2 \
+        + average * (target_low + target_high) / 2 \
+        + good * (target_high + target_zero + 4) / 2
+    return days * 24
+
+
+def remaining_reworks(job: Job, config: Config) -> int:
+    return config.max_rework_count - job.rework_attempts()
+
+
+def arrival_time(job: Job, config: Config) -> float:
+    # Reworked jobs keep their first arrival time, so they go ahead of newer
+    # jobs
+    return job.arrival_time
+
+
+DISCIPLINES: dict[str, JobKey | None] = {
+    'fifo': None,
+    'spt': expected_process_time,
+    'fewest_remaining_reworks': remaining_reworks,
+    'earliest_arrival': arrival_time,
+}
+
+
+def register_discipline(name: str, key: JobKey) -> None:
+    """
+    Make a custom discipline selectable by name in Config.queue_disciplines.
+    key must be picklable (e.g. a module-level function) for snapshots.
+    """
+    DISCIPLINES[name] = key
+
+
+def operator_key(operator: Operator, key: Callable[[Job], Any]) -> Any:
+    return key(operator.job)
+
+
+def make_queue(config: Config, queue: str) -> Queue | PriorityQueue:
+    """An empty dispatch queue, ordered as config specifies for queue"""
+    if queue not in DISPATCH_QUEUES:
+        raise ConfigError(f"no dispatch queue {queue}")
+    name = config.queue_disciplines.get(queue, 'fifo')
+    if name not in DISCIPLINES:
+        raise ConfigError(f"unknown queue discipline {name}")
+    if DISCIPLINES[name] is None:
+        return Queue()
+
+    key = partial(DISCIPLINES[name], config=config)
+    if queue.endswith('_operator_queue'):
+        return PriorityQueue(partial(operator_key, key=key))
+    return PriorityQueue(key)
@@ -1,32 +1,59 @@
+from __future__ import annotations
+
+from enum import Enum
+from typing import Callable
+
 import numpy as np
 
-from config import Config
+from config import Config, ConfigError, ARRIVAL_EXPONENTIAL, \
+    DISPATCH_QUEUES, Reliability
+from dispatch import make_queue
 from util import Queue
 from op import HarvestOperator, ProcessOperator
-from job import Job, Patient
-from machine import HarvestMachine, ProcessMachine, QCMachine
+from job import Job, JobOutcome, Patient
+from jobstore import JobStore
+from machine import Machine, HarvestMachine, ProcessMachine, QCMachine
 from event import Event, EventQueue, EventType
+from sink import EventSink, NullSink
+from streams import RandomStreams
+from metrics import Metrics
+from profiling import Profiler
 
 
 class Environment:
-    def __init__(self, config: Config):
+    def __init__(self,
+                 config: Config,
+                 rng: np.random.Generator = None,
+                 sink: EventSink = None,
+                 metrics: Metrics = None,
+                 profiler: Profiler = None):
         self.clock = 0
         self.job_gen_count = 0
         self.config = config
 
+        # Every random draw in a simulation comes from streams derived from
+        # this generator, so that a seeded generator reproduces a run exactly
+        # and gives common random numbers across configurations
+        if rng is None:
+            rng = np.random.default_rng()
+        self.streams = RandomStreams(rng)
+
+        # Every processed event is emitted here. The default keeps no trace.
+        self.sink = sink if sink is not None else NullSink()
+        self.event_count = 0
+
         self.pending_events = EventQueue()
-        self.initial_job_queue = None
-        self.populate_initial_events_and_jobs()
+        self.next_arrival_time = 0
+        self.schedule_next_arrival()
 
-        self.events = []
-        self.finished_jobs = []
+        self.finished_jobs = JobStore()
 
         self.harvest_machine_queue = Queue(
             [HarvestMachine(i) for i in range(config.harvest_machine_count)]
         )
 
         self.process_machine_queue = Queue(
-            [ProcessMachine(i) for i in range(config.harvest_machine_count)]
+            [ProcessMachine(i) for i in range(config.process_machine_count)]
         )
 
         self.harvest_operator_queue = Queue(
@@ -37,246 +64,497 @@ class Environment:
             [ProcessOperator(i) for i in range(config.process_operator_count)]
         )
 
+        # Ids for resources added by apply_config. Retired resources keep
+        # theirs, so an id is never reused.
+        self.next_ids = {
+            'harvest_machine': config.harvest_machine_count,
+            'process_machine': config.process_machine_count,
+            'harvest_operator': config.harvest_operator_count,
+            'process_operator': config.process_operator_count,
+        }
+
         # If a job is awaiting an operator, it is placed in this queue
-        self.harvest_operator_job_queue = Queue()
-        self.process_operator_job_queue = Queue()
+        self.harvest_operator_job_queue = make_queue(
+            config, 'harvest_operator_job_queue')
+        self.process_operator_job_queue = make_queue(
+            config, 'process_operator_job_queue')
 
         # If a job and operator are awaiting a machine, the operator
         # is placed in this queue
-        self.harvest_machine_operator_queue = Queue()
-        self.process_machine_operator_queue = Queue()
-
-        self.qc_machine = QCMachine()
+        self.harvest_machine_operator_queue = make_queue(
+            config, 'harvest_machine_operator_queue')
+        self.process_machine_operator_queue = make_queue(
+            config, 'process_machine_operator_queue')
+
+        self.qc_machine = QCMachine(rng)
+
+        # Idle machines taken out of their pool by a failure, until repaired
+        self.idle_broken: set[Machine] = set()
+        # The pending setup or work event of each machine in service, and the
+        # pending failure or repair of each machine with breakdowns, as
+        # handles for rescheduling
+        self.machine_events: dict[Machine, Event] = {}
+        self.breakdowns: dict[Machine, Event] = {}
+        for machine in [*self.harvest_machine_queue,
+                        *self.process_machine_queue]:
+            self.schedule_failure(machine)
 
         self.qc_job_queue = Queue()
 
+        # Matching only runs after a handler has made a new pairing possible.
+        # Handlers that push onto a job/operator queue or an operator/machine
+        # queue must set the corresponding flag.
+        self.operators_dirty = True
+        self.machines_dirty = True
+
+        # Built once; see register_handler
+        self.handlers: dict[Enum, Callable[[Event], None]] = {
+            EventType.HARVEST_ARRIVAL: self.harvest_arrival,
+            EventType.HARVEST_DEPARTURE: self.harvest_departure,
+            EventType.START_HARVEST_SETUP: self.start_harvest_setup,
+            EventType.END_HARVEST_SETUP: self.end_harvest_setup,
+            EventType.START_HARVESTING: self.start_harvesting,
+            EventType.END_HARVESTING: self.end_harvesting,
+
+            EventType.PROCESS_ARRIVAL: self.process_arrival,
+            EventType.PROCESS_DEPARTURE: self.process_departure,
+            EventType.START_PROCESS_SETUP: self.start_process_setup,
+            EventType.END_PROCESS_SETUP: self.end_process_setup,
+            EventType.START_PROCESSING: self.start_processing,
+            EventType.END_PROCESSING: self.end_processing,
+
+            EventType.COLLECT: self.collect,
+
+            EventType.QC_ARRIVAL: self.qc_arrival,
+            EventType.QC_DEPARTURE: self.qc_departure,
+            EventType.START_QC: self.start_qc,
+            EventType.END_QC: self.end_qc,
+
+            EventType.MACHINE_FAILURE: self.machine_failure,
+            EventType.MACHINE_REPAIR: self.machine_repair,
+        }
+
+        # Optional online KPI collection
+        self.metrics = metrics.attach(self) if metrics is not None else None
+
+        # Optional instrumentation, which wraps the hot path methods of this
+        # instance only
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.instrument(self)
+
     def get_next_event(self) -> Event:
         next_event = self.pending_events.pop()
         if self.clock < next_event.time:
             self.clock = next_event.time
         return next_event
 
-    def populate_initial_events_and_jobs(self) -> None:
-        jobs = [Job(Patient.random(self.config.patient_config), i)
-                for i in range(self.config.patient_count)]
-        self.initial_job_queue = Queue(jobs)
-        elapsed_arrival_time = 0
-        for job in jobs:
-            if elapsed_arrival_time > self.config.simulation_time:
-                break
-            #  job.enter_system(elapsed_arrival_time)
-            event = Event(EventType.HARVEST_ARRIVAL,
-                          elapsed_arrival_time).set_job(job)
-            self.pending_events.push(event)
-            elapsed_arrival_time += np.random.randint(2, 5)
-        return self.initial_job_queue
+    def next_interarrival_time(self) -> float:
+        if self.config.patient_arrival_distribution == ARRIVAL_EXPONENTIAL:
+            return self.streams.arrivals.exponential(3.0)
+        return self.streams.arrivals.integers(2, 5)
+
+    def schedule_next_arrival(self) -> None:
+        """
+        Create the next patient and schedule its arrival. Patients are only
+        generated when the previous one arrives, so the pending events hold
+        at most one future arrival regardless of the cohort size.
+        """
+        if (self.config.patient_count is not None
+                and self.job_gen_count >= self.config.patient_count):
+            return
+        if self.next_arrival_time > self.config.simulation_time:
+            return
+
+        job = Job(Patient.random(self.config.patient_config,
+                                 self.streams.patients),
+                  self.job_gen_count)
+        job.streams = self.streams.job(job.id)
+        self.job_gen_count += 1
+        event = Event(EventType.HARVEST_ARRIVAL, self.next_arrival_time,
+                      job=job)
+        self.pending_events.push(event)
+        self.next_arrival_time += self.next_interarrival_time()
 
     def assign_jobs_to_operators(self) -> None:
-        if self.harvest_operator_queue.empty():
-            return
-        while job := self.harvest_operator_job_queue.pop():
-            if self.harvest_operator_queue.empty():
-                break
+        self.operators_dirty = False
+        while not (self.harvest_operator_job_queue.empty()
+                   or self.harvest_operator_queue.empty()):
+            job = self.harvest_operator_job_queue.pop()
             operator = self.harvest_operator_queue.pop()
             operator.job = job
-            event = Event(EventType.HARVEST_DEPARTURE, self.clock) \
-                .set_job(job) \
-                .set_operator(operator)
+            event = Event(EventType.HARVEST_DEPARTURE, self.clock, job=job,
+                          operator=operator)
             self.pending_events.push(event)
-            
-        if self.process_operator_queue.empty():
-            return
-        while job := self.process_operator_job_queue.pop():
-            if self.process_operator_queue.empty():
-                break
+
+        while not (self.process_operator_job_queue.empty()
+                   or self.process_operator_queue.empty()):
+            job = self.process_operator_job_queue.pop()
             operator = self.process_operator_queue.pop()
             operator.job = job
-            event = Event(EventType.PROCESS_DEPARTURE, self.clock) \
-                .set_job(job) \
-                .set_operator(operator)
+            event = Event(EventType.PROCESS_DEPARTURE, self.clock, job=job,
+                          operator=operator)
             self.pending_events.push(event)
 
     def assign_operators_to_machines(self) -> None:
-        if self.harvest_machine_queue.empty():
-            return
-        while operator := self.harvest_machine_operator_queue.pop():
-            if self.harvest_machine_queue.empty():
-                break
+        self.machines_dirty = False
+        while not (self.harvest_machine_operator_queue.empty()
+                   or self.harvest_machine_queue.empty()):
+            operator = self.harvest_machine_operator_queue.pop()
             machine = self.harvest_machine_queue.pop()
             machine.initialize(operator)
-            event = Event(EventType.START_HARVEST_SETUP, self.clock) \
-                .set_job(operator.job) \
-                .set_operator(operator) \
-                .set_machine(machine)
-            self.pending_events.push(event)
-
-        if self.process_machine_queue.empty():
-            return
-        while operator := self.process_machine_operator_queue.pop():
-            if self.process_machine_queue.empty():
-                break
+            event = Event(EventType.START_HARVEST_SETUP, self.clock,
+                          job=operator.job, operator=operator,
+                          machine=machine)
+            self.schedule_machine_event(event)
+
+        while not (self.process_machine_operator_queue.empty()
+                   or self.process_machine_queue.empty()):
+            operator = self.process_machine_operator_queue.pop()
             machine = self.process_machine_queue.pop()
             machine.initialize(operator)
-            event = Event(EventType.START_PROCESS_SETUP, self.clock) \
-                .set_job(operator.job) \
-                .set_operator(operator) \
-                .set_machine(machine)
-            self.pending_events.push(event)
-
-    def simulate(self) -> None:
+            event = Event(EventType.START_PROCESS_SETUP, self.clock,
+                          job=operator.job, operator=operator,
+                          machine=machine)
+            self.schedule_machine_event(event)
+
+    def simulate(self, until: float = None) -> None:
+        """
+        Run to the end of the simulation, or stop once the next event would
+        be after time until. A stopped simulation can be resumed by calling
+        simulate again.
+        """
         while self.clock <= self.config.simulation_time:
-            self.assign_jobs_to_operators()
-            self.assign_operators_to_machines()
+            if self.operators_dirty:
+                self.assign_jobs_to_operators()
+            if self.machines_dirty:
+                self.assign_operators_to_machines()
+            if self.metrics is not None:
+                self.metrics.observe(self.clock)
             if self.pending_events.empty():
                 break
+            if until is not None and self.pending_events.peek_time() > until:
+                self.clock = max(self.clock, until)
+                break
             event = self.get_next_event()
-            print(event)
+            self.sink.emit(event)
             self.process_event(event)
-            self.events.append(event)
+            self.event_count += 1
+        self.sink.flush()
+
+    def __getstate__(self) -> dict:
+        # Sinks hold open files and profilers replace methods on the instance
+        # with wrappers; neither survives a copy, which starts untraced
+        state = dict(vars(self))
+        state['sink'] = None
+        state['profiler'] = None
+        for name in list(state):
+            if hasattr(type(self), name):
+                del state[name]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        vars(self).update(state)
+        self.sink = NullSink()
+
+    def jobs_in_system(self) -> list[Job]:
+        """Jobs that have been created but not finished, in id order"""
+        jobs = {}
+        for event in self.pending_events:
+            if event.job is not None:
+                jobs[event.job.id] = event.job
+        for queue in [self.harvest_operator_job_queue,
+                      self.process_operator_job_queue]:
+            for job in queue:
+                jobs[job.id] = job
+        for queue in [self.harvest_machine_operator_queue,
+                      self.process_machine_operator_queue]:
+            for operator in queue:
+                jobs[operator.job.id] = operator.job
+        return [jobs[i] for i in sorted(jobs)]
+
+    def reseed(self, rng: np.random.Generator) -> Environment:
+        """
+        Replace every random stream, including those already reserved by jobs
+        in the system, with streams derived from rng
+        """
+        self.streams = RandomStreams(rng)
+        for job in self.jobs_in_system():
+            job.streams = self.streams.job(job.id)
+        return self
+
+    def apply_config(self, config: Config) -> Environment:
+        """
+        Continue the simulation under config. Resource pools grow with new
+        idle resources; they can only shrink by retiring idle resources.
+        """
+        for queue, make, old, new, pool in [
+                (self.harvest_machine_queue, HarvestMachine,
+                 self.config.harvest_machine_count,
+                 config.harvest_machine_count, 'harvest_machine'),
+                (self.process_machine_queue, ProcessMachine,
+                 self.config.process_machine_count,
+                 config.process_machine_count, 'process_machine'),
+                (self.harvest_operator_queue, HarvestOperator,
+                 self.config.harvest_operator_count,
+                 config.harvest_operator_count, 'harvest_operator'),
+                (self.process_operator_queue, ProcessOperator,
+                 self.config.process_operator_count,
+                 config.process_operator_count, 'process_operator')]:
+            if old - new > len(queue):
+                raise ConfigError(f"cannot retire busy {pool} resources")
+            for _ in range(old, new):
+                queue.push(make(self.next_ids[pool]))
+                self.next_ids[pool] += 1
+            for _ in range(new, old):
+                queue.pop()
+            if self.metrics is not None:
+                self.metrics.capacity[pool] = new
+
+        # Queues whose discipline changed are rebuilt, keeping their contents
+        for name in DISPATCH_QUEUES:
+            if config.queue_disciplines.get(name) \
+                    == self.config.queue_disciplines.get(name):
+                continue
+            old = getattr(self, name)
+            queue = make_queue(config, name)
+            while not old.empty():
+                queue.push(old.pop())
+            setattr(self, name, queue)
+            if self.metrics is not None:
+                self.metrics.track_queue(name, queue)
+
+        # Machines with a failure or repair pending keep it, with later
+        # failures drawn under the new config. Every other live machine,
+        # whether new or until now without breakdowns, starts failing now.
+        self.config = config
+        machines = [*self.harvest_machine_queue, *self.process_machine_queue,
+                    *self.idle_broken, *self.machine_events]
+        for machine in machines:
+            self.schedule_failure(machine)
+        self.operators_dirty = True
+        self.machines_dirty = True
+        return self
+
+    def register_handler(self,
+                         event_type: Enum,
+                         handler: Callable[[Event], None]) -> Environment:
+        """
+        Route events of event_type to handler, replacing any existing handler.
+        event_type may be a member of an enum other than EventType, which lets
+        new pipeline stages schedule their own events.
+        """
+        self.handlers[event_type] = handler
+        return self
 
     def process_event(self, event: Event) -> None:
-        {
-            EventType.HARVEST_ARRIVAL: lambda e: self.harvest_arrival(e),
-            EventType.HARVEST_DEPARTURE: lambda e: self.harvest_departure(e),
-            EventType.START_HARVEST_SETUP: lambda e: self.start_harvest_setup(e),
-            EventType.END_HARVEST_SETUP: lambda e: self.end_harvest_setup(e),
-            EventType.START_HARVESTING: lambda e: self.start_harvesting(e),
-            EventType.END_HARVESTING: lambda e: self.end_harvesting(e),
-
-            EventType.PROCESS_ARRIVAL: lambda e: self.process_arrival(e),
-            EventType.PROCESS_DEPARTURE: lambda e: self.process_departure(e),
-            EventType.START_PROCESS_SETUP: lambda e: self.start_process_setup(e),
-            EventType.END_PROCESS_SETUP: lambda e: self.end_process_setup(e),
-            EventType.START_PROCESSING: lambda e: self.start_processing(e),
-            EventType.END_PROCESSING: lambda e: self.end_processing(e),
-
-            EventType.COLLECT: lambda e: self.collect(e),
-
-            EventType.QC_ARRIVAL: lambda e: self.qc_arrival(e),
-            EventType.QC_DEPARTURE: lambda e: self.qc_departure(e),
-            EventType.START_QC: lambda e: self.start_qc(e),
-            EventType.END_QC: lambda e: self.end_qc(e),
-        }[event.event_type](event)
+        self.handlers[event.event_type](event)
 
     def harvest_arrival(self, event: Event) -> None:
+        # Reworked jobs arrive again, but only a first arrival brings in the
+        # next patient
+        if event.job.arrival_time < 0:
+            self.schedule_next_arrival()
+        event.job.enter_system(self.clock)
         self.harvest_operator_job_queue.push(event.job)
+        self.operators_dirty = True
 
     def harvest_departure(self, event: Event) -> None:
         self.harvest_machine_operator_queue.push(event.operator)
+        self.machines_dirty = True
 
     def start_harvest_setup(self, event: Event) -> None:
         event.machine.start_setup()
-        setup_duration = np.random.randint(1, 3)
-        next_event = Event(EventType.END_HARVEST_SETUP, self.clock + setup_duration) \
-            .set_job(event.job) \
-            .set_operator(event.operator) \
-            .set_machine(event.machine)
-        self.pending_events.push(next_event)
+        setup_duration = event.job.streams.setup.integers(1, 3)
+        next_event = Event(EventType.END_HARVEST_SETUP,
+                           self.clock + setup_duration, job=event.job,
+                           operator=event.operator, machine=event.machine)
+        self.schedule_machine_event(next_event)
 
     def end_harvest_setup(self, event: Event) -> None:
         event.machine.end_setup()
-        next_event = Event(EventType.START_HARVESTING, self.clock) \
-            .set_job(event.job) \
-            .set_machine(event.machine)
+        next_event = Event(EventType.START_HARVESTING, self.clock,
+                           job=event.job, machine=event.machine)
         self.harvest_operator_queue.push(event.operator.clear())
-        self.pending_events.push(next_event)
+        self.operators_dirty = True
+        self.schedule_machine_event(next_event)
 
     def start_harvesting(self, event: Event) -> None:
         event.machine.start_work()
-        harvest_duration = event.job.calculate_harvest_duration()
-        next_event = Event(
-            EventType.END_HARVESTING, self.clock + harvest_duration) \
-            .set_job(event.job) \
-            .set_machine(event.machine)
-        self.pending_events.push(next_event)
+        harvest_duration = event.job.calculate_harvest_duration(
+            event.job.streams.harvest)
+        next_event = Event(EventType.END_HARVESTING,
+                           self.clock + harvest_duration, job=event.job,
+                           machine=event.machine)
+        self.schedule_machine_event(next_event)
 
     def end_harvesting(self, event: Event) -> None:
         event.machine.end_work()
         event.machine.clear()
-        next_event = Event(EventType.PROCESS_ARRIVAL, self.clock) \
-            .set_job(event.job)
+        next_event = Event(EventType.PROCESS_ARRIVAL, self.clock,
+                           job=event.job)
+        del self.machine_events[event.machine]
         self.harvest_machine_queue.push(event.machine)
+        self.machines_dirty = True
         self.pending_events.push(next_event)
 
     def process_arrival(self, event: Event) -> None:
         self.process_operator_job_queue.push(event.job)
+        self.operators_dirty = True
 
     def process_departure(self, event: Event) -> None:
         self.process_machine_operator_queue.push(event.operator)
+        self.machines_dirty = True
 
     def start_process_setup(self, event: Event) -> None:
         event.machine.start_setup()
-        setup_duration = np.random.randint(1, 3)
-        next_event = Event(EventType.END_PROCESS_SETUP, self.clock + setup_duration) \
-            .set_job(event.job) \
-            .set_operator(event.operator) \
-            .set_machine(event.machine)
-        self.pending_events.push(next_event)
+        setup_duration = event.job.streams.setup.integers(1, 3)
+        next_event = Event(EventType.END_PROCESS_SETUP,
+                           self.clock + setup_duration, job=event.job,
+                           operator=event.operator, machine=event.machine)
+        self.schedule_machine_event(next_event)
 
     def end_process_setup(self, event: Event) -> None:
         event.machine.end_setup()
-        next_event = Event(EventType.START_PROCESSING, self.clock) \
-            .set_job(event.job) \
-            .set_machine(event.machine)
-        self.harvest_operator_queue.push(event.operator.clear())
-        self.pending_events.push(next_event)
+        next_event = Event(EventType.START_PROCESSING, self.clock,
+                           job=event.job, machine=event.machine)
+        self.process_operator_queue.push(event.operator.clear())
+        self.operators_dirty = True
+        self.schedule_machine_event(next_event)
 
     def start_processing(self, event: Event) -> None:
         event.machine.start_work()
-        process_duration = event.job.calculate_process_duration(self.config)
-        next_event = Event(
-            EventType.END_PROCESSING, self.clock + process_duration) \
-            .set_job(event.job) \
-            .set_machine(event.machine)
+        process_duration = event.job.calculate_process_duration(
+            self.config, event.job.streams.process)
+        next_event = Event(EventType.END_PROCESSING,
+                           self.clock + process_duration, job=event.job,
+                           machine=event.machine)
         event.job \
             .set_process_times(self.clock, self.clock + process_duration) \
-            .calculate_yield_after_process(self.config)
-        self.pending_events.push(next_event)
+            .calculate_yield_after_process(
+                self.config, event.job.streams.yield_noise)
+        self.schedule_machine_event(next_event)
 
     def end_processing(self, event: Event) -> None:
         event.machine \
             .end_work() \
             .clear()
-        next_event = Event(EventType.COLLECT, self.clock) \
-            .set_job(event.job)
-        self.harvest_machine_queue.push(event.machine)
+        next_event = Event(EventType.COLLECT, self.clock, job=event.job)
+        del self.machine_events[event.machine]
+        self.process_machine_queue.push(event.machine)
+        self.machines_dirty = True
         self.pending_events.push(next_event)
 
     def collect(self, event: Event) -> None:
         if event.job.process_yield <= 0:
             job = event.job.attempt_rework(self.clock)
-            next_event = Event(EventType.HARVEST_ARRIVAL, self.clock).set_job(job)
+            next_event = Event(EventType.HARVEST_ARRIVAL, self.clock, job=job)
         else:
             event.job \
                 .set_collect_time(self.clock) \
-                .calculate_yield_after_collect(self.config)
-            next_event = Event(EventType.QC_ARRIVAL, self.clock).set_job(event.job)
+                .calculate_yield_after_collect(
+                    self.config, event.job.streams.yield_noise)
+            if self.metrics is not None:
+                self.metrics.job_collected(event.job)
+            next_event = Event(EventType.QC_ARRIVAL, self.clock, job=event.job)
         self.pending_events.push(next_event)
 
     def qc_arrival(self, event: Event) -> None:
         #  self.qc_job_queue.push(event.job)
-        next_event = Event(EventType.QC_DEPARTURE, self.clock) \
-            .set_job(event.job)
+        next_event = Event(EventType.QC_DEPARTURE, self.clock, job=event.job)
         self.pending_events.push(next_event)
 
     def qc_departure(self, event: Event) -> None:
-        next_event = Event(EventType.START_QC, self.clock) \
-            .set_job(event.job)
+        next_event = Event(EventType.START_QC, self.clock, job=event.job)
         self.pending_events.push(next_event)
 
     def start_qc(self, event: Event) -> None:
         qc_duration = 0.5
-        if self.qc_machine.quality_policy():
-            next_event = Event(EventType.END_QC, self.clock + qc_duration) \
-                .set_job(event.job)
+        if self.qc_machine.quality_policy(event.job.streams.qc):
+            next_event = Event(EventType.END_QC, self.clock + qc_duration,
+                               job=event.job)
             self.pending_events.push(next_event)
         else:
             if event.job.rework_attempts() <= self.config.max_rework_count:
-                next_event = Event(EventType.HARVEST_ARRIVAL, self.clock + qc_duration) \
-                    .set_job(event.job.attempt_rework(self.clock))
+                next_event = Event(EventType.HARVEST_ARRIVAL,
+                                   self.clock + qc_duration,
+                                   job=event.job.attempt_rework(self.clock))
                 self.pending_events.push(next_event)
             else:
-                self.finished_jobs.append(event.job)
+                self.finish_job(event.job, JobOutcome.REJECTED)
 
     def end_qc(self, event: Event) -> None:
-        self.finished_jobs.append(event.job)
+        self.finish_job(event.job, JobOutcome.ACCEPTED)
+
+    def finish_job(self, job: Job, outcome: JobOutcome) -> None:
+        # The job is recorded as a row of finished_jobs, after which nothing
+        # in the environment refers to it
+        job.finish_time = self.clock
+        job.streams = None
+        self.finished_jobs.append(job, outcome)
+        if self.metrics is not None:
+            self.metrics.job_finished(job, self.clock)
+
+    def reliability(self, machine: Machine) -> Reliability | None:
+        if isinstance(machine, HarvestMachine):
+            return self.config.harvest_machine_reliability
+        return self.config.process_machine_reliability
+
+    def machine_pool(self, machine: Machine) -> Queue:
+        if isinstance(machine, HarvestMachine):
+            return self.harvest_machine_queue
+        return self.process_machine_queue
+
+    def schedule_machine_event(self, event: Event) -> None:
+        self.machine_events[event.machine] = event
+        self.pending_events.push(event)
+
+    def schedule_failure(self, machine: Machine) -> None:
+        # A machine with a failure pending already, or under repair (whose
+        # repair schedules the next failure), is left alone
+        reliability = self.reliability(machine)
+        if reliability is None or machine in self.breakdowns:
+            return
+        uptime = self.streams.breakdowns.exponential(reliability.mtbf)
+        event = Event(EventType.MACHINE_FAILURE, self.clock + uptime,
+                      machine=machine)
+        self.breakdowns[machine] = event
+        self.pending_events.push(event)
+
+    def machine_failure(self, event: Event) -> None:
+        machine = event.machine
+        del self.breakdowns[machine]
+        reliability = self.reliability(machine)
+        if reliability is None:
+            # Breakdowns were switched off by apply_config
+            return
+        repair_duration = self.streams.breakdowns.exponential(reliability.mttr)
+
+        if machine.queued():
+            self.machine_pool(machine).remove(machine)
+            self.idle_broken.add(machine)
+        elif machine in self.machine_events:
+            # The machine's next event ends its current setup or work, or
+            # starts the next step. Pushing it back by the repair time pauses
+            # the job (and during setup, its operator) until the repair.
+            work = self.machine_events[machine]
+            self.machine_events[machine] = self.pending_events.reschedule(
+                work, work.time + repair_duration)
+        else:
+            # Retired by apply_config
+            return
+
+        next_event = Event(EventType.MACHINE_REPAIR,
+                           self.clock + repair_duration, machine=machine)
+        self.breakdowns[machine] = next_event
+        self.pending_events.push(next_event)
+
+    def machine_repair(self, event: Event) -> None:
+        machine = event.machine
+        del self.breakdowns[machine]
+        if machine in self.idle_broken:
+            self.idle_broken.discard(machine)
+            self.machine_pool(machine).push(machine)
+            self.machines_dirty = True
+        self.schedule_failure(machine)
+
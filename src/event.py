@@ -1,8 +1,10 @@
 from __future__ import annotations
-from functools import total_ordering
-
 import heapq
+import math
+from collections import deque
 from enum import Enum
+from itertools import chain, count
+from typing import Iterator
 
 from op import Operator
 from job import Job
@@ -34,21 +36,32 @@ class EventType(Enum):
     START_QC = 15
     END_QC = 16
 
+    MACHINE_FAILURE = 17
+    MACHINE_REPAIR = 18
+
 
-@total_ordering
 class Event:
     """
     Event_type includes arrival, harvest, process, finish
     Event is defined as a point on the timeline.
     """
 
-    def __init__(self, event_type: EventType, time: float):
+    # Events are the most frequently allocated objects in a simulation, so
+    # they carry no per-instance __dict__
+    __slots__ = ('event_type', 'time', 'job', 'operator', 'machine')
+
+    def __init__(self,
+                 event_type: EventType,
+                 time: float,
+                 job: Job = None,
+                 operator: Operator = None,
+                 machine: Machine = None):
         self.event_type = event_type
         self.time = time
 
-        self.machine = None
-        self.operator = None
-        self.job = None
+        self.machine = machine
+        self.operator = operator
+        self.job = job
 
     def __str__(self) -> str:
         return f"Event {self.event_type} at {self.time}\n" \
@@ -56,17 +69,6 @@ class Event:
             f"\tOperator: {self.operator}\n" \
             f"\tJob: {self.job}\n"
 
-    # This is not a good hash function, but we only need a hash to ensure that
-    # events can be ordered (EventQueue requires this)
-    def __hash__(self):
-        return hash(str(self))
-
-    def __lt__(self: Event, other: Event):
-        return self.time < other.time
-
-    def __eq__(self: Event, other: Event):
-        return self.time == other.time
-
     def set_machine(self, machine: Machine) -> Event:
         self.machine = machine
         return self
@@ -80,18 +82,87 @@ class Event:
         return self
 
 
-# Priority queue for events
+# Pending events, popped in (time, push order). Most transitions schedule
+# their follow-up at the current time, so those zero-delay events skip the
+# heap and wait in a FIFO lane; later events go on the heap as (time,
+# sequence, event) entries, where the increasing sequence number breaks ties
+# in push order and keeps heap comparisons from reaching the Event. Any heap
+# event for the current time was pushed at an earlier time, and so before
+# everything in the lane; popping those first keeps exactly the order a
+# single heap would give.
+#
+# A pushed event is its own handle for cancel() and reschedule(). Cancelled
+# events stay where they are and are skipped when they reach the front, so
+# a queue that never cancels pays only an empty-set check per pop.
 class EventQueue:
     def __init__(self):
         self.__buf = []
+        self.__now = deque()
+        self.__seq = count()
+        self.__time = -math.inf
+        self.__cancelled: set[Event] = set()
 
     def push(self, e: Event) -> EventQueue:
-        heapq.heappush(self.__buf, (e.time, e))
+        if e.time <= self.__time:
+            self.__now.append(e)
+        else:
+            heapq.heappush(self.__buf, (e.time, next(self.__seq), e))
         return self
 
     def pop(self) -> Event:
-        popped = heapq.heappop(self.__buf)
-        return popped[1]
+        now = self.__now
+        cancelled = self.__cancelled
+        while True:
+            if now and not (self.__buf and self.__buf[0][0] <= now[0].time):
+                e = now.popleft()
+            else:
+                e = heapq.heappop(self.__buf)[2]
+                self.__time = e.time
+            if not (cancelled and e in cancelled):
+                return e
+            cancelled.discard(e)
+
+    def cancel(self, e: Event) -> EventQueue:
+        """Remove e, which must be pending, from the queue"""
+        self.__cancelled.add(e)
+        return self
+
+    def reschedule(self, e: Event, time: float) -> Event:
+        """
+        Move the pending event e to time. Returns the event now scheduled,
+        which is the handle for any further changes.
+        """
+        self.cancel(e)
+        moved = Event(e.event_type, time, e.job, e.operator, e.machine)
+        self.push(moved)
+        return moved
+
+    def __prune(self) -> None:
+        # Drop cancelled events from the front, so peeking sees a live one
+        cancelled = self.__cancelled
+        while self.__now and self.__now[0] in cancelled:
+            cancelled.discard(self.__now.popleft())
+        while self.__buf and self.__buf[0][2] in cancelled:
+            cancelled.discard(heapq.heappop(self.__buf)[2])
 
     def empty(self) -> bool:
-        return len(self.__buf) == 0
+        if self.__cancelled:
+            self.__prune()
+        return not (self.__buf or self.__now)
+
+    def peek_time(self) -> float:
+        if self.__cancelled:
+            self.__prune()
+        if self.__now:
+            return self.__now[0].time
+        return self.__buf[0][0]
+
+    # Pending events in no particular order
+    def __iter__(self) -> Iterator[Event]:
+        events = chain((entry[2] for entry in self.__buf), self.__now)
+        if self.__cancelled:
+            return (e for e in events if e not in self.__cancelled)
+        return events
+
+    def __len__(self) -> int:
+        return len(self.__buf) + len(self.__now) - len(self.__cancelled)
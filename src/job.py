@@ -1,13 +1,11 @@
 from __future__ import annotations
 
-import random
-
-from scipy import stats
 import numpy as np
 from enum import Enum
 
 from config import Config, PatientConfig
 from util import Queueable
+from truncnorm import truncated_normal
 
 
 class JobError(Exception):
@@ -27,14 +25,32 @@ class P_Type(Enum):
     GOOD = 1.0
 
 
+P_GENDERS = list(P_Gender)
+P_TYPES = list(P_Type)
+
+# Yield noise is normal with its mean 0.84 standard deviations above the
+# deterministic yield, truncated symmetrically about the mean with the
+# deterministic yield as the lower bound. In standardized units the bounds
+# never change, so a single sampler serves every job.
+YIELD_NOISE_OFFSET = 0.84
+YIELD_NOISE = truncated_normal(-YIELD_NOISE_OFFSET, YIELD_NOISE_OFFSET)
+
+
+# Patients and jobs are created for every arrival, so they use slots rather
+# than a per-instance __dict__. pconfig is a reference to the shared
+# PatientConfig, not a copy.
 class Patient:
+    __slots__ = ('gender', 'ptype', 'blood_volume', 'target_blood_count',
+                 'pconfig')
+
     def __init__(self,
                  gender: P_Gender,
                  ptype: P_Type,
-                 pconfig: PatientConfig):
+                 pconfig: PatientConfig,
+                 rng: np.random.Generator):
         self.gender = gender
         self.ptype = ptype
-        self.blood_volume = np.random.uniform(
+        self.blood_volume = rng.uniform(
             low=pconfig.blood_vol_range[gender.value].low,
             high=pconfig.blood_vol_range[gender.value].high
         )
@@ -42,12 +58,14 @@ class Patient:
         self.pconfig = pconfig
 
     @staticmethod
-    def random(pconfig: PatientConfig):
+    def random(pconfig: PatientConfig, rng: np.random.Generator):
         """Generate a random patient"""
         gr = pconfig.gender_ratio
-        gender = random.choices(list(P_Gender), weights=[gr, 1 - gr])[0]
-        ptype = random.choices(list(P_Type), weights=pconfig.patient_rates)[0]
-        return Patient(gender, ptype, pconfig)
+        gender = P_GENDERS[0 if rng.uniform(0, 1) < gr else 1]
+        total = sum(pconfig.patient_rates)
+        weights = [rate / total for rate in pconfig.patient_rates]
+        ptype = P_TYPES[rng.choice(len(P_TYPES), p=weights)]
+        return Patient(gender, ptype, pconfig, rng)
 
     def __str__(self) -> str:
         return f"Patient [{self.gender.name}, {self.ptype.name}, " \
@@ -65,17 +83,32 @@ class JobStatus(Enum):
     DONE = 5
 
 
+# How a finished job left the system: passed QC, or failed QC with no rework
+# attempts left
+class JobOutcome(Enum):
+    ACCEPTED = 0
+    REJECTED = 1
+
+
 class Job(Queueable):
+    __slots__ = ('patient', 'arrival_time', 'start_process_time',
+                 'end_process_time', 'collect_time', 'finish_time',
+                 'rework_times', 'status', 'process_yield', 'id', 'streams')
+
     def __init__(self, patient: Patient, id: int):
         super().__init__()
         self.patient = patient
+        self.arrival_time = -1
         self.start_process_time = -1
         self.end_process_time = -1
         self.collect_time = -1
+        self.finish_time = -1
         self.rework_times = []
         self.status = JobStatus.IDLE
         self.process_yield = 0
         self.id = id
+        # Per-job random streams (streams.JobStreams), set by the environment
+        self.streams = None
 
     def __str__(self):
         return f"Job {self.id} {self.rework_times}\n"\
@@ -85,11 +118,18 @@ class Job(Queueable):
         self.status = status
         return self
 
+    def enter_system(self, clock: float) -> Job:
+        # Reworked jobs re-enter harvesting but keep their first arrival time
+        if self.arrival_time < 0:
+            self.arrival_time = clock
+        return self
+
     def harvest_yield(self) -> float:
         return 0.8 * self.patient.target_blood_count
 
     def attempt_rework(self, rework_time: float) -> Job:
-        self.process_time = -1
+        self.start_process_time = -1
+        self.end_process_time = -1
         self.collect_time = -1
         self.status = JobStatus.IDLE
         self.process_yield = 0
@@ -109,7 +149,7 @@ class Job(Queueable):
         return self
 
     @staticmethod
-    def truncated_norm(lower, mu, sigma) -> float:
+    def truncated_norm(lower, mu, sigma, rng: np.random.Generator) -> float:
         """
         Generates a random number from a truncated normal distribution.
 
@@ -118,19 +158,14 @@ class Job(Queueable):
         mu (float): the desired mean
         sigma (float): the desired standard deviation to use to generate the
                        distribution.
+        rng (Generator): the random generator to draw from.
 
         Returns:
         float: randomly genereated number.
         """
         upper = mu + (mu - lower)
-        # Generates a random variable/randomizer based on a truncated normal
-        # distribution.
-        X = stats.truncnorm(
-            (lower - mu) / sigma, (upper - mu) / sigma, loc=mu, scale=sigma)
-        # Genereates an array of random numbers of size 1 and grabs the first
-        # number from the array.
-        res = X.rvs(1)[0]
-        return res
+        sampler = truncated_normal((lower - mu) / sigma, (upper - mu) / sigma)
+        return sampler.sample(mu, sigma, rng)
 
     def targets(self, config: Config) -> tuple(float, float, float, float):
         target_bc = self.patient.target_blood_count
@@ -140,21 +175,26 @@ class Job(Queueable):
 
         return target_low, target_high, target_zero
 
-    def calculate_harvest_duration(self) -> int:
-        return np.random.randint(6, 9)
+    def calculate_harvest_duration(self, rng: np.random.Generator) -> int:
+        return rng.integers(6, 9)
 
-    def calculate_process_duration(self, config: Config) -> float:
-        target_bc = self.patient.target_blood_count
+    def calculate_process_duration(self,
+                                   config: Config,
+                                   rng: np.random.Generator) -> float:
         target_low, target_high, target_zero = self.targets(config)
-        process_duration = random.choices([
-            np.random.uniform(0, target_low),
-            np.random.uniform(target_low, target_high),
-            np.random.uniform(target_high, target_zero + 4)],
-            weights=config.manufacturing_duration_percentage)[0]
+        bounds = [(0, target_low),
+                  (target_low, target_high),
+                  (target_high, target_zero + 4)]
+        # Pick the duration band first so only one uniform is drawn per job
+        band = rng.choice(3, p=config.manufacturing_duration_percentage)
+        process_duration = rng.uniform(*bounds[band])
         process_duration_in_hours = process_duration * 24
         return process_duration_in_hours
 
-    def calculate_yield(self, duration: float, config: Config) -> float:
+    def calculate_yield(self,
+                        duration: float,
+                        config: Config,
+                        rng: np.random.Generator) -> float:
         #  if self.status not in [JobStatus.PROCESSED, JobStatus.DONE]:
         #      raise JobError
 
@@ -171,10 +211,9 @@ class Job(Queueable):
             p_yield = 0
 
         if p_yield > 0:
-            mu = p_yield + 0.84 * config.yield_standard_deviation
-            p_yield = self.truncated_norm(
-                p_yield, mu, config.yield_standard_deviation
-            )
+            sigma = config.yield_standard_deviation
+            mu = p_yield + YIELD_NOISE_OFFSET * sigma
+            p_yield = YIELD_NOISE.sample(mu, sigma, rng)
 
         p_yield *= self.patient.ptype.value
 
@@ -185,12 +224,16 @@ class Job(Queueable):
 
         return p_yield
 
-    def calculate_yield_after_process(self, config: Config) -> Job:
+    def calculate_yield_after_process(self,
+                                      config: Config,
+                                      rng: np.random.Generator) -> Job:
         self.process_yield = self.calculate_yield(
-            self.end_process_time - self.start_process_time, config)
+            self.end_process_time - self.start_process_time, config, rng)
         return self
 
-    def calculate_yield_after_collect(self, config: Config) -> Job:
+    def calculate_yield_after_collect(self,
+                                      config: Config,
+                                      rng: np.random.Generator) -> Job:
         self.process_yield = self.calculate_yield(
-            self.collect_time - self.start_process_time, config)
+            self.collect_time - self.start_process_time, config, rng)
         return self
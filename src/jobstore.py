@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from enum import Enum
+
+import numpy as np
+
+from job import Job, JobOutcome, P_TYPES
+
+
+JOB_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('gender', 'u1'),
+    ('ptype', 'u1'),
+    ('blood_volume', '<f8'),
+    ('target_blood_count', '<f8'),
+    ('arrival_time', '<f8'),
+    ('start_process_time', '<f8'),
+    ('end_process_time', '<f8'),
+    ('collect_time', '<f8'),
+    ('finish_time', '<f8'),
+    ('process_yield', '<f8'),
+    ('rework_count', '<u2'),
+    ('status', 'u1'),
+])
+
+
+def job_record(job: Job, outcome: JobOutcome) -> tuple:
+    patient = job.patient
+    return (job.id, patient.gender.value, P_TYPES.index(patient.ptype),
+            patient.blood_volume, patient.target_blood_count,
+            job.arrival_time, job.start_process_time, job.end_process_time,
+            job.collect_time, job.finish_time, job.process_yield,
+            job.rework_attempts(), outcome.value)
+
+
+# Finished jobs as rows of a structured array, one field per column. The
+# array doubles whenever it fills up, so appending is amortized constant time
+# and the Job objects themselves can be dropped once recorded. Enum fields
+# (gender, ptype, status) hold the enum value, or for ptype the index into
+# P_TYPES.
+class JobStore:
+    def __init__(self, capacity: int = 1024):
+        self.__data = np.zeros(max(capacity, 1), dtype=JOB_DTYPE)
+        self.__size = 0
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def __getitem__(self, key):
+        """A column by field name, or rows by index, slice or mask"""
+        return self.array[key]
+
+    @property
+    def array(self) -> np.ndarray:
+        return self.__data[:self.__size]
+
+    def append(self, job: Job, outcome: JobOutcome) -> JobStore:
+        if self.__size == len(self.__data):
+            self.__grow(2 * len(self.__data))
+        self.__data[self.__size] = job_record(job, outcome)
+        self.__size += 1
+        return self
+
+    def extend(self, records: np.ndarray) -> JobStore:
+        needed = self.__size + len(records)
+        if needed > len(self.__data):
+            self.__grow(max(needed, 2 * len(self.__data)))
+        self.__data[self.__size:needed] = records
+        self.__size = needed
+        return self
+
+    def __grow(self, capacity: int) -> None:
+        data = np.zeros(capacity, dtype=JOB_DTYPE)
+        data[:self.__size] = self.__data[:self.__size]
+        self.__data = data
+
+    def mask(self, **filters) -> np.ndarray:
+        """
+        Boolean mask of the jobs whose fields equal every given filter, e.g.
+        mask(status=JobOutcome.ACCEPTED, ptype=2). Enum values are accepted
+        for enum fields.
+        """
+        data = self.array
+        selected = np.ones(self.__size, dtype=bool)
+        for field, value in filters.items():
+            if value in P_TYPES:
+                value = P_TYPES.index(value)
+            elif isinstance(value, Enum):
+                value = value.value
+            selected &= data[field] == value
+        return selected
+
+    def count(self, **filters) -> int:
+        return int(np.count_nonzero(self.mask(**filters)))
+
+    def cycle_times(self) -> np.ndarray:
+        return self['finish_time'] - self['arrival_time']
+
+    def mean(self, field: str, **filters) -> float:
+        """Mean of field over the jobs matching filters, nan if there are none"""
+        values = self[field][self.mask(**filters)]
+        return float(values.mean()) if len(values) else np.nan
+
+    def group_mean(self, field: str, by: str) -> dict[int, float]:
+        """Mean of field for every value of the integer field by"""
+        keys = self[by].astype(np.int64)
+        counts = np.bincount(keys)
+        sums = np.bincount(keys, weights=self[field].astype(float))
+        return {int(k): float(sums[k] / counts[k])
+                for k in np.flatnonzero(counts)}
+
+    def group_count(self, by: str) -> dict[int, int]:
+        counts = np.bincount(self[by].astype(np.int64))
+        return {int(k): int(counts[k]) for k in np.flatnonzero(counts)}
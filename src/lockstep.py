@@ -0,0 +1,389 @@
+"""
+Vectorized engine that advances many replications of the default model in
+lockstep, with NumPy arrays in place of per-replication Python objects.
+
+Resources of a kind are interchangeable, so operators are free counts and
+machines are slots holding a phase and a timer. Every step, each replication
+handles its own earliest timer (the next arrival, a machine finishing setup
+or work, or a QC rework re-entering harvest). Then jobs, operators and
+machines are matched from FIFO ring buffers, as Environment does. The
+zero-duration events of the reference engine are folded into these
+transitions.
+"""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+from scipy import stats
+
+from config import Config, ConfigError, ARRIVAL_EXPONENTIAL
+from environment import Environment
+from job import P_TYPES
+from replication import spawn_generators
+from yield_model import calculate_yield, targets
+
+
+KPIS = ['finished_count', 'throughput', 'mean_yield', 'mean_cycle_time']
+
+IDLE, SETUP, WORK = 0, 1, 2
+
+
+# One FIFO queue per replication, stored as rows of a ring buffer
+class RingQueues:
+    def __init__(self, replications: int, capacity: int):
+        self.capacity = max(capacity, 1)
+        self.data = np.zeros((replications, self.capacity), dtype=np.int64)
+        self.head = np.zeros(replications, dtype=np.int64)
+        self.size = np.zeros(replications, dtype=np.int64)
+
+    def push(self, r: np.ndarray, values: np.ndarray) -> None:
+        self.data[r, (self.head[r] + self.size[r]) % self.capacity] = values
+        self.size[r] += 1
+
+    def pop(self, r: np.ndarray) -> np.ndarray:
+        values = self.data[r, self.head[r]]
+        self.head[r] = (self.head[r] + 1) % self.capacity
+        self.size[r] -= 1
+        return values
+
+
+def process_duration(target_bc: np.ndarray,
+                     config: Config,
+                     rng: np.random.Generator) -> np.ndarray:
+    """Job.calculate_process_duration over an array of jobs"""
+    target_low, target_high, target_zero = targets(target_bc, config)
+    cumulative = np.cumsum(config.manufacturing_duration_percentage)[:-1]
+    band = np.searchsorted(cumulative, rng.random(len(target_bc)),
+                           side='right')
+    low = np.choose(band, [0 * target_low, target_low, target_high])
+    high = np.choose(band, [target_low, target_high, target_zero + 4])
+    return rng.uniform(low, high) * 24
+
+
+class LockstepEngine:
+    def __init__(self,
+                 config: Config,
+                 replications: int,
+                 rng: np.random.Generator = None):
+        if any(d != 'fifo' for d in config.queue_disciplines.values()):
+            raise ConfigError('the lockstep engine only models FIFO queues')
+        if config.harvest_machine_reliability is not None \
+                or config.process_machine_reliability is not None:
+            raise ConfigError('the lockstep engine does not model breakdowns')
+        if rng is None:
+            rng = np.random.default_rng()
+        self.config = config
+        self.rng = rng
+        self.replications = R = replications
+        self.rows = np.arange(R)
+
+        self.__generate_patients()
+        N = self.job_capacity
+
+        Hm = config.harvest_machine_count
+        Pm = config.process_machine_count
+        # Timer columns: next arrival, harvest machines, process machines,
+        # then one delayed QC rework per process machine. A process machine
+        # cannot finish twice within the 0.5 hour QC delay (setup alone
+        # takes an hour), so one rework slot per machine suffices.
+        self.harvest_cols = slice(1, 1 + Hm)
+        self.process_cols = slice(1 + Hm, 1 + Hm + Pm)
+        self.rework_cols = slice(1 + Hm + Pm, 1 + Hm + 2 * Pm)
+        self.timers = np.full((R, 1 + Hm + 2 * Pm), np.inf)
+        self.timers[:, 0] = self.arrival_times[:, 0]
+        self.next_arrival = np.zeros(R, dtype=np.int64)
+
+        self.harvest_phase = np.zeros((R, Hm), dtype=np.int8)
+        self.harvest_job = np.zeros((R, Hm), dtype=np.int64)
+        self.process_phase = np.zeros((R, Pm), dtype=np.int8)
+        self.process_job = np.zeros((R, Pm), dtype=np.int64)
+        self.rework_job = np.zeros((R, Pm), dtype=np.int64)
+
+        self.harvest_operators = np.full(R, config.harvest_operator_count)
+        self.process_operators = np.full(R, config.process_operator_count)
+
+        # Jobs awaiting an operator, and jobs (with their operator) awaiting
+        # a machine
+        self.harvest_jobs = RingQueues(R, N)
+        self.process_jobs = RingQueues(R, N)
+        self.harvest_waiting = RingQueues(R, config.harvest_operator_count)
+        self.process_waiting = RingQueues(R, config.process_operator_count)
+
+        self.attempts = np.zeros((R, N), dtype=np.int64)
+        self.duration = np.zeros((R, N))
+        self.job_yield = np.zeros((R, N))
+
+        self.clock = np.zeros(R)
+        self.done = np.zeros(R, dtype=bool)
+        self.finished_count = np.zeros(R, dtype=np.int64)
+        self.yield_sum = np.zeros(R)
+        self.cycle_time_sum = np.zeros(R)
+
+    def __generate_patients(self) -> None:
+        config = self.config
+        pconfig = config.patient_config
+        R = self.replications
+        T = config.simulation_time
+
+        if config.patient_arrival_distribution == ARRIVAL_EXPONENTIAL:
+            mean = T / 3
+            bound = int(mean + 10 * math.sqrt(mean)) + 16
+        else:
+            bound = int(T // 2) + 2
+        if config.patient_count is not None:
+            bound = min(bound, config.patient_count)
+        N = self.job_capacity = max(bound, 1)
+
+        if config.patient_arrival_distribution == ARRIVAL_EXPONENTIAL:
+            gaps = self.rng.exponential(3.0, (R, N - 1))
+        else:
+            gaps = self.rng.integers(2, 5, (R, N - 1))
+        times = np.zeros((R, N + 1))
+        times[:, 1:N] = np.cumsum(gaps, axis=1)
+        times[:, N] = np.inf
+        times[times > T] = np.inf
+        self.arrival_times = times
+        self.first_arrival = times[:, :N].copy()
+
+        male = self.rng.random((R, N)) < pconfig.gender_ratio
+        ranges = pconfig.blood_vol_range
+        low = np.where(male, ranges.male.low, ranges.female.low)
+        high = np.where(male, ranges.male.high, ranges.female.high)
+        self.target_bc = pconfig.conversion_factor * self.rng.uniform(low, high)
+
+        rates = np.asarray(pconfig.patient_rates, dtype=float)
+        ptype = self.rng.choice(len(P_TYPES), size=(R, N), p=rates / rates.sum())
+        self.multiplier = np.array([t.value for t in P_TYPES])[ptype]
+
+    def run(self) -> dict[str, np.ndarray]:
+        T = self.config.simulation_time
+        harvest_start = self.harvest_cols.start
+        process_start = self.process_cols.start
+        rework_start = self.rework_cols.start
+
+        while True:
+            self.__match()
+            column = np.argmin(self.timers, axis=1)
+            time = self.timers[self.rows, column]
+            self.done |= time > T
+            if self.done.all():
+                break
+            active = ~self.done
+            self.clock[active] = time[active]
+
+            r = np.flatnonzero(active & (column == 0))
+            if len(r):
+                self.__arrive(r)
+
+            harvest = active & (column >= harvest_start) \
+                & (column < process_start)
+            r = np.flatnonzero(harvest)
+            if len(r):
+                self.__harvest_timer(r, column[r] - harvest_start)
+
+            process = active & (column >= process_start) \
+                & (column < rework_start)
+            r = np.flatnonzero(process)
+            if len(r):
+                self.__process_timer(r, column[r] - process_start)
+
+            r = np.flatnonzero(active & (column >= rework_start))
+            if len(r):
+                slot = column[r] - rework_start
+                self.harvest_jobs.push(r, self.rework_job[r, slot])
+                self.timers[r, rework_start + slot] = np.inf
+
+        return self.kpis()
+
+    def kpis(self) -> dict[str, np.ndarray]:
+        finished = self.finished_count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {
+                'finished_count': finished,
+                'throughput': finished / self.config.simulation_time,
+                'mean_yield': np.where(
+                    finished > 0, self.yield_sum / finished, np.nan),
+                'mean_cycle_time': np.where(
+                    finished > 0, self.cycle_time_sum / finished, np.nan),
+            }
+
+    def __arrive(self, r: np.ndarray) -> None:
+        job = self.next_arrival[r]
+        self.harvest_jobs.push(r, job)
+        self.next_arrival[r] += 1
+        self.timers[r, 0] = self.arrival_times[r, job + 1]
+
+    def __harvest_timer(self, r: np.ndarray, slot: np.ndarray) -> None:
+        column = self.harvest_cols.start + slot
+        setup = self.harvest_phase[r, slot] == SETUP
+
+        # End of setup: the operator is released and harvesting starts
+        rs, ss = r[setup], slot[setup]
+        self.harvest_operators[rs] += 1
+        self.harvest_phase[rs, ss] = WORK
+        self.timers[rs, column[setup]] = self.clock[rs] \
+            + self.rng.integers(6, 9, len(rs))
+
+        # End of harvesting: the machine is released and the job moves on
+        rw, sw = r[~setup], slot[~setup]
+        self.harvest_phase[rw, sw] = IDLE
+        self.timers[rw, column[~setup]] = np.inf
+        self.process_jobs.push(rw, self.harvest_job[rw, sw])
+
+    def __process_timer(self, r: np.ndarray, slot: np.ndarray) -> None:
+        config = self.config
+        column = self.process_cols.start + slot
+        setup = self.process_phase[r, slot] == SETUP
+
+        # End of setup: the operator is released, processing starts and the
+        # yield at the end of processing is already determined
+        rs, ss = r[setup], slot[setup]
+        job = self.process_job[rs, ss]
+        self.process_operators[rs] += 1
+        self.process_phase[rs, ss] = WORK
+        bc = self.target_bc[rs, job]
+        duration = process_duration(bc, config, self.rng)
+        self.duration[rs, job] = duration
+        self.job_yield[rs, job] = calculate_yield(
+            duration, bc, self.multiplier[rs, job], config, self.rng)
+        self.timers[rs, column[setup]] = self.clock[rs] + duration
+
+        # End of processing: the machine is released and the job collected
+        rw, sw = r[~setup], slot[~setup]
+        job = self.process_job[rw, sw]
+        self.process_phase[rw, sw] = IDLE
+        self.timers[rw, column[~setup]] = np.inf
+        self.__collect(rw, sw, job)
+
+    def __collect(self, r: np.ndarray, slot: np.ndarray, job: np.ndarray):
+        config = self.config
+        clock = self.clock[r]
+
+        # Nothing to collect: straight back to harvesting
+        failed = self.job_yield[r, job] <= 0
+        self.attempts[r[failed], job[failed]] += 1
+        self.harvest_jobs.push(r[failed], job[failed])
+
+        r, slot, job, clock = r[~failed], slot[~failed], job[~failed], \
+            clock[~failed]
+        self.job_yield[r, job] = calculate_yield(
+            self.duration[r, job], self.target_bc[r, job],
+            self.multiplier[r, job], config, self.rng)
+
+        passed = self.rng.random(len(r)) > 0.95
+        self.__finish(r[passed], job[passed], clock[passed] + 0.5)
+
+        r, slot, job, clock = r[~passed], slot[~passed], job[~passed], \
+            clock[~passed]
+        rework = self.attempts[r, job] <= config.max_rework_count
+        rr, sr, jr = r[rework], slot[rework], job[rework]
+        self.attempts[rr, jr] += 1
+        self.rework_job[rr, sr] = jr
+        self.timers[rr, self.rework_cols.start + sr] = clock[rework] + 0.5
+
+        self.__finish(r[~rework], job[~rework], clock[~rework])
+
+    def __finish(self, r: np.ndarray, job: np.ndarray, time: np.ndarray):
+        # Completions after the horizon are never reached by the reference
+        # engine either
+        counted = time <= self.config.simulation_time
+        r, job, time = r[counted], job[counted], time[counted]
+        np.add.at(self.finished_count, r, 1)
+        np.add.at(self.yield_sum, r, self.job_yield[r, job])
+        np.add.at(self.cycle_time_sum, r, time - self.first_arrival[r, job])
+
+    def __match(self) -> None:
+        active = ~self.done
+        while True:
+            matched = False
+
+            r = np.flatnonzero(active & (self.harvest_jobs.size > 0)
+                               & (self.harvest_operators > 0))
+            if len(r):
+                matched = True
+                self.harvest_operators[r] -= 1
+                self.harvest_waiting.push(r, self.harvest_jobs.pop(r))
+
+            r = np.flatnonzero(active & (self.process_jobs.size > 0)
+                               & (self.process_operators > 0))
+            if len(r):
+                matched = True
+                self.process_operators[r] -= 1
+                self.process_waiting.push(r, self.process_jobs.pop(r))
+
+            idle = self.harvest_phase == IDLE
+            r = np.flatnonzero(active & (self.harvest_waiting.size > 0)
+                               & idle.any(axis=1))
+            if len(r):
+                matched = True
+                slot = np.argmax(idle[r], axis=1)
+                self.harvest_job[r, slot] = self.harvest_waiting.pop(r)
+                self.harvest_phase[r, slot] = SETUP
+                self.timers[r, self.harvest_cols.start + slot] = \
+                    self.clock[r] + self.rng.integers(1, 3, len(r))
+
+            idle = self.process_phase == IDLE
+            r = np.flatnonzero(active & (self.process_waiting.size > 0)
+                               & idle.any(axis=1))
+            if len(r):
+                matched = True
+                slot = np.argmax(idle[r], axis=1)
+                self.process_job[r, slot] = self.process_waiting.pop(r)
+                self.process_phase[r, slot] = SETUP
+                self.timers[r, self.process_cols.start + slot] = \
+                    self.clock[r] + self.rng.integers(1, 3, len(r))
+
+            if not matched:
+                return
+
+
+def run_lockstep(config: Config,
+                 n: int,
+                 seed: int = None) -> dict[str, np.ndarray]:
+    """KPIs of n replications of config, one array entry per replication"""
+    return LockstepEngine(config, n, np.random.default_rng(seed)).run()
+
+
+def reference_kpis(config: Config,
+                   n: int,
+                   seed: int = None) -> dict[str, np.ndarray]:
+    """The same KPIs from n replications of the Environment engine"""
+    result = {kpi: np.zeros(n) for kpi in KPIS}
+    for i, rng in enumerate(spawn_generators(seed, n)):
+        env = Environment(config, rng)
+        env.simulate()
+        jobs = env.finished_jobs
+        kept = jobs['finish_time'] <= config.simulation_time
+        count = int(np.count_nonzero(kept))
+        result['finished_count'][i] = count
+        result['throughput'][i] = count / config.simulation_time
+        result['mean_yield'][i] = jobs['process_yield'][kept].mean() \
+            if count else np.nan
+        result['mean_cycle_time'][i] = jobs.cycle_times()[kept].mean() \
+            if count else np.nan
+    return result
+
+
+def equivalence_test(config: Config,
+                     n: int,
+                     seed: int = None) -> dict[str, dict]:
+    """
+    Compare the KPI distributions of both engines over n replications each,
+    with Welch's t-test on the means and a two-sample Kolmogorov-Smirnov test
+    on the distributions. Small p-values indicate the engines disagree.
+    """
+    ours_seed, theirs_seed = np.random.SeedSequence(seed).generate_state(2)
+    ours = run_lockstep(config, n, int(ours_seed))
+    theirs = reference_kpis(config, n, int(theirs_seed))
+    result = {}
+    for kpi in KPIS:
+        a = ours[kpi][~np.isnan(ours[kpi])]
+        b = theirs[kpi][~np.isnan(theirs[kpi])]
+        result[kpi] = {
+            'lockstep_mean': float(a.mean()) if len(a) else np.nan,
+            'reference_mean': float(b.mean()) if len(b) else np.nan,
+            't_pvalue': float(stats.ttest_ind(a, b, equal_var=False).pvalue),
+            'ks_pvalue': float(stats.ks_2samp(a, b).pvalue),
+        }
+    return result
@@ -22,7 +22,10 @@ class MachineState(Enum):
 
 # TODO: set job statuses in machines
 class Machine(Queueable):
+    __slots__ = ('state', 'operator', 'job', 'id')
+
     def __init__(self, id: int):
+        super().__init__()
         self.state = MachineState.IDLE
         self.operator: Operator = None
         self.job: Job = None
@@ -85,6 +88,8 @@ class Machine(Queueable):
 
 
 class HarvestMachine(Machine):
+    __slots__ = ()
+
     def __init__(self, id: int):
         super().__init__(id)
 
@@ -98,6 +103,8 @@ class HarvestMachine(Machine):
 
 
 class ProcessMachine(Machine):
+    __slots__ = ()
+
     def __init__(self, id: int):
         super().__init__(id)
 
@@ -111,8 +118,12 @@ class ProcessMachine(Machine):
 
 
 class QCMachine:
-    def __init__(self):
+    def __init__(self, rng: np.random.Generator):
         super().__init__()
+        self.rng = rng
 
-    def quality_policy(self) -> bool:
-        return np.random.uniform(0, 1) > 0.95
+    def quality_policy(self, rng: np.random.Generator = None) -> bool:
+        # rng overrides the machine's own generator, e.g. with a per-job stream
+        if rng is None:
+            rng = self.rng
+        return rng.uniform(0, 1) > 0.95
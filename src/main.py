@@ -1,10 +1,236 @@
-from config import Config
+"""
+Run BioMan simulations from the command line.
+
+    python main.py study.toml -n 100 --workers 8 --seed 1 --output out.json
+
+A config file (JSON or TOML) holds Config attributes in the form of
+Config.to_dict(), any of which may be left out to keep the default. An
+optional sweep table maps attribute names (dotted for nested ones, e.g.
+"patient_config.gender_ratio") to lists of values, and every combination is
+run. For example:
+
+    simulation_time = 5000
+    patient_count = false    # no cohort limit
+
+    [patient_config]
+    patient_rates = [2, 4, 4]
+
+    [sweep]
+    process_machine_count = [8, 16]
+    process_operator_count = [4, 8]
+
+Summaries are written as JSON, or one row per replication for a .csv output.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tomllib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from config import Config, ConfigError, plain
 from environment import Environment
+from replication import Replication, spawn_generators, summarize
+from sequential import estimate
+from sink import BinarySink, NullSink, TextSink
+from sweep import ResultCache, grid, run_sweep
+from tracefile import TraceWriter
 
 
-def main():
-    env = Environment(Config())
+SINKS = ['none', 'text', 'binary', 'trace']
+
+
+def load(path: str) -> tuple[Config, dict[str, list]]:
+    """The config in the file at path, and its sweep axes (possibly empty)"""
+    if path.endswith('.toml'):
+        with open(path, 'rb') as f:
+            values = tomllib.load(f)
+    else:
+        with open(path) as f:
+            values = json.load(f)
+    axes = values.pop('sweep', {})
+    for name, axis in axes.items():
+        if not isinstance(axis, list) or not axis:
+            raise ConfigError(f"sweep axis {name} must be a non-empty list")
+    return Config.from_dict(values), axes
+
+
+def sweep_values(config: Config, axes: dict[str, list]) -> dict:
+    """The swept attributes of config, in the form of Config.to_dict()"""
+    values = {}
+    for name in axes:
+        target = config
+        for part in name.split('.'):
+            target = getattr(target, part)
+        values[name] = plain(target)
+    return values
+
+
+def run_with_sink(config: Config,
+                  index: int,
+                  rng: np.random.Generator,
+                  kind: str,
+                  path: str) -> Replication:
+    """One replication with its events written to path by a kind sink"""
+    if kind == 'text':
+        stream = open(path, 'w') if path is not None else sys.stdout
+        sink = TextSink(stream)
+    elif kind == 'binary':
+        sink = BinarySink(path)
+    elif kind == 'trace':
+        sink = TraceWriter(path)
+    else:
+        sink = NullSink()
+    env = Environment(config, rng, sink=sink)
     env.simulate()
+    sink.close()
+    if kind == 'text' and path is not None:
+        stream.close()
+    return summarize(index, env)
+
+
+def sink_path(directory: str, kind: str, c: int, i: int) -> str:
+    if directory is None:
+        return None
+    suffix = {'text': '.txt', 'binary': '.bin', 'trace': ''}[kind]
+    return os.path.join(directory, f"config{c}_rep{i}{suffix}")
+
+
+def run_with_sinks(configs: list[Config],
+                   n: int,
+                   workers: int,
+                   seed: int,
+                   kind: str,
+                   directory: str) -> list[list[Replication]]:
+    rngs = spawn_generators(seed, n)
+    tasks = [(c, i) for c in range(len(configs)) for i in range(n)]
+    args = ([configs[c] for c, _ in tasks], [i for _, i in tasks],
+            [rngs[i] for _, i in tasks], repeat(kind),
+            [sink_path(directory, kind, c, i) for c, i in tasks])
+    results = [[None] * n for _ in configs]
+    if workers <= 1:
+        for (c, i), replication in zip(tasks, map(run_with_sink, *args)):
+            results[c][i] = replication
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for (c, i), replication in zip(tasks,
+                                           pool.map(run_with_sink, *args)):
+                results[c][i] = replication
+    return results
+
+
+def summary(replications: list[Replication], confidence: float) -> dict:
+    kpis = {
+        'finished_count': [r.finished_count for r in replications],
+        'throughput': [r.finished_count / r.clock if r.clock > 0 else 0.0
+                       for r in replications],
+        'mean_yield': [r.mean_yield for r in replications],
+        'event_count': [r.event_count for r in replications],
+    }
+    return {kpi: estimate(values, confidence)._asdict()
+            for kpi, values in kpis.items()}
+
+
+def write_json(path: str, seed: int, configs: list[Config],
+               axes: dict[str, list], results: list[list[Replication]],
+               confidence: float) -> None:
+    document = {
+        'seed': seed,
+        'confidence': confidence,
+        'configs': [{
+            'sweep': sweep_values(config, axes),
+            'config': config.to_dict(),
+            'summary': summary(replications, confidence),
+            'replications': [r._asdict() for r in replications],
+        } for config, replications in zip(configs, results)],
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+
+
+def write_csv(path: str, configs: list[Config], axes: dict[str, list],
+              results: list[list[Replication]]) -> None:
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['config', *axes, *Replication._fields])
+        for c, (config, replications) in enumerate(zip(configs, results)):
+            # Records and lists go in one cell each, as JSON
+            swept = [v if isinstance(v, (int, float, str)) or v is None
+                     else json.dumps(v)
+                     for v in sweep_values(config, axes).values()]
+            for r in replications:
+                writer.writerow([c, *swept, *r])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('config', nargs='?',
+                        help='JSON or TOML config file (default: Config())')
+    parser.add_argument('-n', '--replications', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int,
+                        help='root seed (default: random, and recorded in '
+                        'the output)')
+    parser.add_argument('--horizon', type=float,
+                        help='override simulation_time, in hours')
+    parser.add_argument('--sink', choices=SINKS, default='none',
+                        help='where to write each replication\'s events')
+    parser.add_argument('--sink-dir',
+                        help='directory for per-replication event files '
+                        '(text goes to stdout without one)')
+    parser.add_argument('--cache',
+                        help='SQLite result cache, used without a sink')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--output',
+                        help='summary file: .csv for one row per '
+                        'replication, otherwise JSON')
+    args = parser.parse_args()
+
+    if args.config is not None:
+        base, axes = load(args.config)
+    else:
+        base, axes = Config(), {}
+    if args.horizon is not None:
+        base.simulation_time = args.horizon
+    configs = grid(base, axes)
+    seed = args.seed if args.seed is not None \
+        else int(np.random.SeedSequence().entropy)
+
+    if args.sink == 'none':
+        cache = ResultCache(args.cache) if args.cache else None
+        results = run_sweep(configs, args.replications, args.workers, seed,
+                            cache)
+        if cache is not None:
+            cache.close()
+    else:
+        if args.sink_dir is not None:
+            os.makedirs(args.sink_dir, exist_ok=True)
+        elif args.sink != 'text':
+            parser.error(f"--sink {args.sink} needs --sink-dir")
+        results = run_with_sinks(configs, args.replications, args.workers,
+                                 seed, args.sink, args.sink_dir)
+
+    for c, (config, replications) in enumerate(zip(configs, results)):
+        estimates = summary(replications, args.confidence)
+        swept = ''.join(f" {k}={v}"
+                        for k, v in sweep_values(config, axes).items())
+        print(f"config {c}{swept}: "
+              f"finished {estimates['finished_count']['mean']:.2f}, "
+              f"yield {estimates['mean_yield']['mean']:.4f}",
+              file=sys.stderr)
+
+    if args.output is not None:
+        if args.output.endswith('.csv'):
+            write_csv(args.output, configs, axes, results)
+        else:
+            write_json(args.output, seed, configs, axes, results,
+                       args.confidence)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import math
+from bisect import insort
+
+from config import DISPATCH_QUEUES
+
+
+# Welford's online mean and variance
+class RunningStat:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.__m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def push(self, x: float) -> RunningStat:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.__m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        return self
+
+    def variance(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return self.__m2 / (self.count - 1)
+
+    def std(self) -> float:
+        return math.sqrt(self.variance())
+
+
+# Jain and Chlamtac's P-square estimate of the p-quantile, using five markers
+# instead of storing the observations
+class P2Quantile:
+    def __init__(self, p: float):
+        if not 0 < p < 1:
+            raise ValueError(f"quantile {p} outside (0, 1)")
+        self.p = p
+        self.count = 0
+        self.__heights = []
+        self.__positions = [1, 2, 3, 4, 5]
+        self.__desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.__increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def push(self, x: float) -> P2Quantile:
+        self.count += 1
+        q = self.__heights
+        if self.count <= 5:
+            insort(q, x)
+            return self
+
+        n = self.__positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.__desired[i] += self.__increments[i]
+
+        for i in range(1, 4):
+            d = self.__desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) \
+                    or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self.__parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+        return self
+
+    def __parabolic(self, i: int, d: int) -> float:
+        q = self.__heights
+        n = self.__positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self) -> float:
+        if self.count == 0:
+            return math.nan
+        if self.count <= 5:
+            # Too few observations for the markers; use the exact quantile
+            q = self.__heights
+            return q[min(len(q) - 1, int(self.p * len(q)))]
+        return self.__heights[2]
+
+
+# Running moments plus a set of streaming quantiles
+class SummaryStat(RunningStat):
+    def __init__(self, quantiles: tuple[float, ...] = (0.5, 0.9, 0.95)):
+        super().__init__()
+        self.quantiles = [P2Quantile(p) for p in quantiles]
+
+    def push(self, x: float) -> SummaryStat:
+        super().push(x)
+        for q in self.quantiles:
+            q.push(x)
+        return self
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': self.std(),
+            'min': self.min,
+            'max': self.max,
+            **{f"p{round(q.p * 100)}": q.value() for q in self.quantiles},
+        }
+
+
+# Time average of a piecewise-constant level, such as a queue length. The
+# level set at time t holds until the next update.
+class TimeWeightedStat:
+    def __init__(self, start: float = 0.0, level: float = 0.0):
+        self.start = start
+        self.last_time = start
+        self.level = level
+        self.area = 0.0
+        self.max = level
+
+    def update(self, time: float, level: float) -> TimeWeightedStat:
+        self.area += self.level * (time - self.last_time)
+        self.last_time = time
+        self.level = level
+        if level > self.max:
+            self.max = level
+        return self
+
+    def mean(self, time: float = None) -> float:
+        if time is None:
+            time = self.last_time
+        elapsed = time - self.start
+        if elapsed <= 0:
+            return self.level
+        return (self.area + self.level * (time - self.last_time)) / elapsed
+
+
+# Constant-memory KPIs for a single Environment. The environment reports job
+# milestones as they happen and calls observe() whenever resource and queue
+# levels may have changed.
+class Metrics:
+    def __init__(self, quantiles: tuple[float, ...] = (0.5, 0.9, 0.95)):
+        self.cycle_time = SummaryStat(quantiles)
+        self.process_yield = SummaryStat(quantiles)
+        self.rework_count = RunningStat()
+        self.finished_count = 0
+        self.clock = 0.0
+
+        self.queue_length: dict[str, TimeWeightedStat] = {}
+        self.utilization: dict[str, TimeWeightedStat] = {}
+        self.capacity: dict[str, int] = {}
+        self.__queues = {}
+        self.__pools = []
+
+    def attach(self, env) -> Metrics:
+        """Start tracking the queues and resource pools of env"""
+        for name in DISPATCH_QUEUES:
+            self.queue_length[name] = TimeWeightedStat(env.clock)
+            self.track_queue(name, getattr(env, name))
+
+        config = env.config
+        for name, queue, capacity in [
+                ('harvest_machine', env.harvest_machine_queue,
+                 config.harvest_machine_count),
+                ('process_machine', env.process_machine_queue,
+                 config.process_machine_count),
+                ('harvest_operator', env.harvest_operator_queue,
+                 config.harvest_operator_count),
+                ('process_operator', env.process_operator_queue,
+                 config.process_operator_count)]:
+            self.utilization[name] = TimeWeightedStat(env.clock)
+            self.capacity[name] = capacity
+            self.__pools.append((name, self.utilization[name], queue))
+        return self
+
+    def track_queue(self, name: str, queue) -> None:
+        """Measure the length of the queue named name from now on"""
+        self.__queues[name] = (self.queue_length[name], queue)
+
+    def observe(self, clock: float) -> None:
+        self.clock = clock
+        for stat, queue in self.__queues.values():
+            stat.update(clock, len(queue))
+        for name, stat, queue in self.__pools:
+            capacity = self.capacity[name]
+            if capacity > 0:
+                stat.update(clock, (capacity - len(queue)) / capacity)
+
+    def job_collected(self, job) -> None:
+        self.process_yield.push(job.process_yield)
+
+    def job_finished(self, job, clock: float) -> None:
+        self.finished_count += 1
+        self.cycle_time.push(clock - job.arrival_time)
+        self.rework_count.push(job.rework_attempts())
+
+    def summary(self) -> dict:
+        return {
+            'finished_count': self.finished_count,
+            'throughput': self.finished_count / self.clock
+            if self.clock > 0 else 0.0,
+            'cycle_time': self.cycle_time.summary(),
+            'process_yield': self.process_yield.summary(),
+            'rework_count': {'mean': self.rework_count.mean,
+                             'max': self.rework_count.max},
+            'queue_length': {name: stat.mean(self.clock)
+                             for name, stat in self.queue_length.items()},
+            'utilization': {name: stat.mean(self.clock)
+                            for name, stat in self.utilization.items()},
+        }
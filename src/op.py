@@ -7,6 +7,8 @@ from job import Job
 # An operator is a Queueable that can be busy working a machine.
 # That's literally it
 class Operator(Queueable):
+    __slots__ = ('__busy', 'job', 'id')
+
     def __init__(self, id: int):
         super().__init__()
         self.__busy = False
@@ -27,10 +29,14 @@ class Operator(Queueable):
 
 
 class HarvestOperator(Operator):
+    __slots__ = ()
+
     def __init__(self, id: int):
         super().__init__(id)
 
 
 class ProcessOperator(Operator):
+    __slots__ = ()
+
     def __init__(self, id: int):
         super().__init__(id)
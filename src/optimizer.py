@@ -0,0 +1,226 @@
+"""
+Choose machine and operator counts by simulation.
+
+Every combination of the counts in a search space is a candidate, and
+candidates are compared on the net hourly cost of a cost model, averaged
+over replications. After a few replications each, the remaining budget is
+spent in rounds. Each round drops the candidates that are clearly worse than
+the current best, then shares the round's replications among the survivors
+by Optimal Computing Budget Allocation (Chen et al.). OCBA favours
+candidates that are close to the best or noisy, where more replications
+most improve the chance of picking the right one.
+
+Replication i of every candidate uses the same generator, so candidates are
+compared under common random numbers and screened on paired differences.
+"""
+from __future__ import annotations
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import stats
+
+from config import Config
+from replication import Replication, run_replication
+from sweep import grid
+
+
+RESOURCES = ['harvest_machine_count', 'process_machine_count',
+             'harvest_operator_count', 'process_operator_count']
+
+# Hourly cost of one of each resource, and the value of a finished job at
+# full yield (a job at yield y is worth y * job_value)
+CostModel = namedtuple('CostModel', [
+    'harvest_machine', 'process_machine', 'harvest_operator',
+    'process_operator', 'job_value'])
+
+Candidate = namedtuple('Candidate', [
+    'counts', 'mean', 'half_width', 'replications', 'eliminated'])
+OptimizationResult = namedtuple('OptimizationResult', [
+    'best', 'config', 'candidates', 'replications'])
+
+
+def resource_cost(config: Config, costs: CostModel) -> float:
+    return config.harvest_machine_count * costs.harvest_machine \
+        + config.process_machine_count * costs.process_machine \
+        + config.harvest_operator_count * costs.harvest_operator \
+        + config.process_operator_count * costs.process_operator
+
+
+def net_cost(replication: Replication,
+             config: Config,
+             costs: CostModel) -> float:
+    """Resource cost per hour less the value of jobs finished per hour"""
+    if replication.finished_count == 0:
+        # mean_yield is nan, but no jobs are worth nothing
+        return resource_cost(config, costs)
+    hours = max(replication.clock, 1e-9)
+    value = costs.job_value * replication.finished_count \
+        * replication.mean_yield / hours
+    return resource_cost(config, costs) - value
+
+
+def replication_generator(seed: int, index: int) -> np.random.Generator:
+    # The same generator replication.spawn_generators gives replication index
+    return np.random.default_rng(np.random.SeedSequence(seed,
+                                                        spawn_key=(index,)))
+
+
+def ocba(means: np.ndarray, stds: np.ndarray, total: float) -> np.ndarray:
+    """
+    OCBA share of total replications for each candidate, for minimization.
+    Candidate i != b gets a share proportional to (std_i / (mean_i -
+    mean_b))^2, and the best b gets std_b * sqrt(sum_i (N_i / std_i)^2).
+    """
+    stds = np.maximum(stds, 1e-12)
+    b = int(np.argmin(means))
+    gaps = np.maximum(means - means[b], 1e-12 * (1 + abs(means[b])))
+    shares = (stds / gaps) ** 2
+    others = np.arange(len(means)) != b
+    shares[b] = stds[b] * np.sqrt(np.sum((shares[others] / stds[others]) ** 2))
+    return total * shares / shares.sum()
+
+
+def optimize(base: Config,
+             space: dict[str, list[int]],
+             costs: CostModel,
+             budget: int,
+             initial: int = 5,
+             increment: int = 20,
+             workers: int = 1,
+             seed: int = None,
+             confidence: float = 0.95) -> OptimizationResult:
+    """
+    Find the lowest net cost combination of resource counts.
+
+    Parameters:
+    base (Config): the configuration being staffed
+    space (dict): resource (see RESOURCES) to the counts to consider.
+                  Resources not given keep their count in base.
+    costs (CostModel): the cost model
+    budget (int): the most replications to run in total
+    initial (int): replications of every candidate before screening
+    increment (int): replications shared out in each later round
+    confidence (float): a candidate is dropped once the best is better with
+                        this confidence (Bonferroni-corrected over the
+                        candidates still in the running)
+
+    Returns:
+    OptimizationResult: the best counts, the best config, every candidate's
+    estimate sorted best first, and the replications actually run.
+    """
+    unknown = set(space) - set(RESOURCES)
+    if unknown:
+        raise ValueError(f"unknown resources {sorted(unknown)}")
+    if initial < 2:
+        raise ValueError('need at least 2 initial replications for variances')
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    configs = grid(base, space)
+    k = len(configs)
+    if budget < k * initial:
+        raise ValueError(f"budget {budget} is less than {initial} "
+                         f"replications of {k} candidates")
+    samples = [[] for _ in configs]
+    alive = np.ones(k, dtype=bool)
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def run(allocation: np.ndarray) -> int:
+        tasks = [(c, i) for c in range(k)
+                 for i in range(len(samples[c]),
+                                len(samples[c]) + int(allocation[c]))]
+        args = ([configs[c] for c, _ in tasks],
+                [i for _, i in tasks],
+                [replication_generator(seed, i) for _, i in tasks])
+        done = map(run_replication, *args) if pool is None \
+            else pool.map(run_replication, *args)
+        for (c, _), replication in zip(tasks, done):
+            samples[c].append(net_cost(replication, configs[c], costs))
+        return len(tasks)
+
+    try:
+        used = run(np.full(k, initial))
+        while used < budget and alive.sum() > 1:
+            screen(samples, alive, confidence)
+            if alive.sum() <= 1:
+                break
+            used += run(allocate(samples, alive,
+                                 min(increment, budget - used)))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    means = np.array([np.mean(s) if s else np.inf for s in samples])
+    best = int(np.argmin(np.where(alive, means, np.inf)))
+    candidates = [
+        Candidate(counts={r: getattr(configs[c], r) for r in RESOURCES},
+                  mean=float(means[c]),
+                  half_width=half_width(samples[c], confidence),
+                  replications=len(samples[c]),
+                  eliminated=not alive[c])
+        for c in range(k)]
+    order = sorted(range(k), key=lambda c: (not alive[c], means[c]))
+    return OptimizationResult(candidates[best].counts, configs[best],
+                              [candidates[c] for c in order], used)
+
+
+def half_width(values: list[float], confidence: float) -> float:
+    if len(values) < 2:
+        return np.inf
+    t = stats.t.ppf((1 + confidence) / 2, len(values) - 1)
+    return float(t * np.std(values, ddof=1) / np.sqrt(len(values)))
+
+
+def screen(samples: list[list[float]],
+           alive: np.ndarray,
+           confidence: float) -> None:
+    """
+    Drop every candidate whose paired difference from the current best is
+    positive with the given confidence, over the replications both have.
+    """
+    live = np.flatnonzero(alive)
+    means = np.array([np.mean(samples[c]) for c in live])
+    b = live[np.argmin(means)]
+    alpha = (1 - confidence) / max(len(live) - 1, 1)
+    for c in live:
+        if c == b:
+            continue
+        m = min(len(samples[c]), len(samples[b]))
+        if m < 2:
+            continue
+        d = np.subtract(samples[c][:m], samples[b][:m])
+        se = np.std(d, ddof=1) / np.sqrt(m)
+        if d.mean() - stats.t.ppf(1 - alpha, m - 1) * se > 0:
+            alive[c] = False
+
+
+def allocate(samples: list[list[float]],
+             alive: np.ndarray,
+             increment: int) -> np.ndarray:
+    """Replications to add to each candidate, increment in total"""
+    live = np.flatnonzero(alive)
+    counts = np.array([len(samples[c]) for c in live])
+    means = np.array([np.mean(samples[c]) for c in live])
+    target = ocba(means,
+                  np.array([np.std(samples[c], ddof=1) for c in live]),
+                  counts.sum() + increment)
+
+    shortfall = np.maximum(target - counts, 0)
+    if shortfall.sum() == 0:
+        # Every candidate already has its share
+        extra = np.zeros(len(live), dtype=np.int64)
+        extra[np.argmin(means)] = increment
+    else:
+        # Shares of the shortfall, rounded down, with the remainder going to
+        # the candidates that rounding shorted most
+        shares = shortfall * increment / shortfall.sum()
+        extra = np.floor(shares).astype(np.int64)
+        left = increment - extra.sum()
+        extra[np.argsort(-(shares - extra))[:left]] += 1
+
+    allocation = np.zeros(len(alive), dtype=np.int64)
+    allocation[live] = extra
+    return allocation
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from enum import Enum
+from time import perf_counter
+
+
+# Call count and wall time of one instrumented function
+class CallStat:
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed: float) -> None:
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+# Opt-in hot path instrumentation. instrument() replaces the environment's
+# process_event and resource matching methods with timed wrappers on that one
+# instance, so an Environment without a profiler runs exactly the same code
+# as before.
+class Profiler:
+    MATCHERS = ['assign_jobs_to_operators', 'assign_operators_to_machines']
+
+    def __init__(self, heap_sample_every: int = 1000):
+        self.heap_sample_every = heap_sample_every
+        self.handlers: dict[Enum, CallStat] = defaultdict(CallStat)
+        self.matchers: dict[str, CallStat] = {
+            name: CallStat() for name in self.MATCHERS}
+        # (clock, pending event count), sampled every heap_sample_every events
+        self.heap_sizes: list[tuple[float, int]] = []
+        self.max_heap_size = 0
+        self.event_count = 0
+
+    def instrument(self, env) -> Profiler:
+        process_event = env.process_event
+        handlers = self.handlers
+        pending = env.pending_events
+
+        def timed_process_event(event):
+            start = perf_counter()
+            process_event(event)
+            handlers[event.event_type].add(perf_counter() - start)
+
+            self.event_count += 1
+            size = len(pending)
+            if size > self.max_heap_size:
+                self.max_heap_size = size
+            if self.event_count % self.heap_sample_every == 0:
+                self.heap_sizes.append((env.clock, size))
+
+        env.process_event = timed_process_event
+        for name in self.MATCHERS:
+            setattr(env, name, self.__timed(getattr(env, name),
+                                            self.matchers[name]))
+        return self
+
+    @staticmethod
+    def __timed(f, stat: CallStat):
+        def timed():
+            start = perf_counter()
+            f()
+            stat.add(perf_counter() - start)
+        return timed
+
+    def report(self) -> str:
+        rows = [(t.name, s) for t, s in self.handlers.items() if s.count] \
+            + list(self.matchers.items())
+        rows.sort(key=lambda row: row[1].total, reverse=True)
+        total = sum(s.total for _, s in rows) or 1.0
+
+        lines = [f"{'handler':<30} {'count':>10} {'total s':>10} "
+                 f"{'mean us':>10} {'max us':>10} {'share':>7}"]
+        for name, s in rows:
+            mean = s.total / s.count if s.count else 0.0
+            lines.append(f"{name:<30} {s.count:>10} {s.total:>10.4f} "
+                         f"{mean * 1e6:>10.2f} {s.max * 1e6:>10.2f} "
+                         f"{s.total / total:>7.1%}")
+        lines.append(f"max pending events: {self.max_heap_size}")
+        return '\n'.join(lines)
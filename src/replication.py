@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from config import Config
+from environment import Environment
+
+
+# Summary of a single replication. Only this (and not the Environment) is
+# shipped back from worker processes
+Replication = namedtuple('Replication', [
+    'index', 'clock', 'event_count', 'finished_count', 'mean_yield'])
+
+
+def spawn_generators(seed: int, n: int) -> list[np.random.Generator]:
+    """
+    Derive n independent generators from a single root seed. Replication i
+    always receives the i-th child, regardless of how the runs are scheduled.
+    """
+    return [np.random.default_rng(s)
+            for s in np.random.SeedSequence(seed).spawn(n)]
+
+
+def summarize(index: int, env: Environment) -> Replication:
+    yields = env.finished_jobs['process_yield']
+    return Replication(
+        index=index,
+        clock=float(env.clock),
+        event_count=env.event_count,
+        finished_count=len(env.finished_jobs),
+        # Undefined (nan) when no job finished, and skipped by estimates
+        mean_yield=float(np.mean(yields)) if len(yields) else np.nan,
+    )
+
+
+def run_replication(config: Config,
+                    index: int,
+                    rng: np.random.Generator) -> Replication:
+    env = Environment(config, rng)
+    env.simulate()
+    return summarize(index, env)
+
+
+def run_replications(config: Config,
+                     n: int,
+                     workers: int = 1,
+                     seed: int = None) -> list[Replication]:
+    """
+    Run n independent replications of config, fanned out over a pool of
+    worker processes.
+
+    Parameters:
+    config (Config): the configuration shared by every replication
+    n (int): the number of replications
+    workers (int): the number of worker processes. With a single worker the
+                   replications run in this process.
+    seed (int): the root seed. Replications are reproducible for a fixed seed
+                and do not depend on the number of workers.
+
+    Returns:
+    list[Replication]: one summary per replication, ordered by index.
+    """
+    rngs = spawn_generators(seed, n)
+    if workers <= 1:
+        return list(map(run_replication, repeat(config), range(n), rngs))
+
+    chunksize = max(1, n // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_replication, repeat(config), range(n), rngs,
+                             chunksize=chunksize))
+
+
+def run_paired(config_a: Config,
+               config_b: Config,
+               n: int,
+               workers: int = 1,
+               seed: int = None) -> list[tuple[Replication, Replication]]:
+    """
+    Run n replications of two configurations with common random numbers:
+    replication i of both configurations is driven by the same generator, so
+    both see the same patients and per-job draws. Differences between the
+    pairs have far lower variance than between independent runs.
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    a = run_replications(config_a, n, workers, seed)
+    b = run_replications(config_b, n, workers, seed)
+    return list(zip(a, b))
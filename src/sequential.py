@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+from scipy import stats
+
+from config import Config
+from environment import Environment
+from replication import spawn_generators
+
+
+KPIS = ['throughput', 'mean_yield', 'cycle_time']
+
+Estimate = namedtuple('Estimate', ['mean', 'half_width', 'count'])
+SequentialResult = namedtuple('SequentialResult', [
+    'replications', 'estimates', 'converged', 'mean_warmup'])
+
+
+def mser(series: np.ndarray, batch: int = 5) -> int:
+    """
+    MSER-m truncation point: the number of leading observations to discard
+    so that the marginal standard error of the remaining batch means is
+    smallest. Only the first half of the series is considered.
+    """
+    k = len(series) // batch
+    if k < 2:
+        return 0
+    means = np.asarray(series[:k * batch], dtype=float) \
+        .reshape(k, batch).mean(axis=1)
+
+    # Tail sums for every truncation point d, computed in one pass
+    tail = means[::-1]
+    count = np.arange(1, k + 1)
+    tail_mean = np.cumsum(tail) / count
+    tail_sq = np.cumsum(tail ** 2) / count
+    statistic = ((tail_sq - tail_mean ** 2) / count)[::-1]
+    d = int(np.argmin(statistic[:k // 2 + 1]))
+    return d * batch
+
+
+def replication_kpis(config: Config,
+                     rng: np.random.Generator,
+                     truncate_warmup: bool) -> dict:
+    """
+    Throughput, mean yield and mean cycle time of finished jobs in one run.
+    With truncate_warmup, jobs finishing before the MSER-5 truncation point of
+    the cycle time series are ignored.
+    """
+    env = Environment(config, rng)
+    env.simulate()
+
+    jobs = env.finished_jobs
+    cycle_times = jobs.cycle_times()
+    start = mser(cycle_times) if truncate_warmup else 0
+    warmup = float(jobs['finish_time'][start - 1]) if start > 0 else 0.0
+    kept = jobs['process_yield'][start:]
+
+    elapsed = env.clock - warmup
+    return {
+        'throughput': len(kept) / elapsed if elapsed > 0 else 0.0,
+        'mean_yield': float(np.mean(kept)) if len(kept) else np.nan,
+        'cycle_time': float(np.mean(cycle_times[start:]))
+        if len(kept) else np.nan,
+        'warmup': warmup,
+    }
+
+
+def estimate(values: list[float], confidence: float) -> Estimate:
+    # Replications without a defined value (e.g. no finished jobs) are skipped
+    x = np.asarray(values, dtype=float)
+    x = x[~np.isnan(x)]
+    if len(x) < 2:
+        return Estimate(float(np.mean(x)) if len(x) else np.nan, np.inf,
+                        len(x))
+    t = stats.t.ppf((1 + confidence) / 2, len(x) - 1)
+    return Estimate(float(x.mean()),
+                    float(t * x.std(ddof=1) / np.sqrt(len(x))), len(x))
+
+
+def run_sequential(config: Config,
+                   targets: dict[str, float],
+                   batch: int = 10,
+                   max_replications: int = 1000,
+                   workers: int = 1,
+                   seed: int = None,
+                   confidence: float = 0.95,
+                   relative: bool = False,
+                   truncate_warmup: bool = False) -> SequentialResult:
+    """
+    Run replications of config in batches until the confidence interval
+    half-width of every KPI in targets is at most its target.
+
+    Parameters:
+    targets (dict): KPI name (see KPIS) to target half-width
+    batch (int): replications per batch, which is also the minimum run
+    relative (bool): targets are fractions of the KPI mean
+    truncate_warmup (bool): drop each replication's initial transient,
+                            detected with MSER-5 on cycle times
+
+    Returns:
+    SequentialResult: the replications actually run, the final estimates,
+    whether every target was met, and the mean truncated warm-up time.
+    """
+    unknown = set(targets) - set(KPIS)
+    if unknown:
+        raise ValueError(f"unknown KPIs {sorted(unknown)}")
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    results = []
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while len(results) < max_replications:
+            start = len(results)
+            end = min(start + batch, max_replications)
+            rngs = spawn_generators(seed, end)[start:end]
+            args = (repeat(config), rngs, repeat(truncate_warmup))
+            if pool is None:
+                results.extend(map(replication_kpis, *args))
+            else:
+                results.extend(pool.map(replication_kpis, *args))
+
+            estimates = {kpi: estimate([r[kpi] for r in results], confidence)
+                         for kpi in KPIS}
+            if all(within(estimates[kpi], target, relative)
+                   for kpi, target in targets.items()):
+                return SequentialResult(len(results), estimates, True,
+                                        mean_warmup(results))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return SequentialResult(len(results), estimates, False,
+                            mean_warmup(results))
+
+
+def within(e: Estimate, target: float, relative: bool) -> bool:
+    limit = target * abs(e.mean) if relative else target
+    return e.half_width <= limit
+
+
+def mean_warmup(results: list[dict]) -> float:
+    return float(np.mean([r['warmup'] for r in results]))
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import struct
+import sys
+from collections import deque
+from typing import BinaryIO, TextIO
+
+import numpy as np
+
+from event import Event
+
+
+# Receives every event an Environment processes. Tracing is entirely the
+# sink's business, so a run that does not need a trace pays one no-op call
+# per event.
+class EventSink:
+    def emit(self, event: Event) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+# Discards everything
+class NullSink(EventSink):
+    def emit(self, event: Event) -> None:
+        pass
+
+
+# Keeps only the most recent events, for debugging
+class RingBufferSink(EventSink):
+    def __init__(self, capacity: int = 1024):
+        self.__buf = deque(maxlen=capacity)
+
+    def emit(self, event: Event) -> None:
+        self.__buf.append(event)
+
+    def events(self) -> list[Event]:
+        return list(self.__buf)
+
+
+# Human-readable trace, in the format the simulator has always printed
+class TextSink(EventSink):
+    def __init__(self, stream: TextIO = None):
+        self.stream = stream if stream is not None else sys.stdout
+
+    def emit(self, event: Event) -> None:
+        print(event, file=self.stream)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+# Fixed-width record: event type, time, job id, machine id, operator id.
+# Missing participants are stored as -1.
+BINARY_RECORD = struct.Struct('<Bdiii')
+BINARY_DTYPE = np.dtype([
+    ('event_type', '<u1'),
+    ('time', '<f8'),
+    ('job', '<i4'),
+    ('machine', '<i4'),
+    ('operator', '<i4'),
+])
+
+
+def participant_id(participant) -> int:
+    return -1 if participant is None else participant.id
+
+
+# Compact binary trace, buffered in memory and written in chunks
+class BinarySink(EventSink):
+    def __init__(self, file: str | BinaryIO, chunk_records: int = 65536):
+        self.__owned = isinstance(file, str)
+        self.file = open(file, 'wb') if self.__owned else file
+        self.__chunk_bytes = chunk_records * BINARY_RECORD.size
+        self.__buf = bytearray()
+
+    def emit(self, event: Event) -> None:
+        self.__buf += BINARY_RECORD.pack(
+            event.event_type.value, event.time, participant_id(event.job),
+            participant_id(event.machine), participant_id(event.operator))
+        if len(self.__buf) >= self.__chunk_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        self.file.write(self.__buf)
+        self.__buf.clear()
+        self.file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        if self.__owned:
+            self.file.close()
+
+
+def read_binary(path: str) -> np.ndarray:
+    """Load a BinarySink trace as a structured array"""
+    return np.fromfile(path, dtype=BINARY_DTYPE)
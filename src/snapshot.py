@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import pickle
+
+from config import Config
+from environment import Environment
+from replication import spawn_generators
+from sink import EventSink
+
+
+# A frozen copy of a running Environment: clock, pending events, resource and
+# job queues, jobs, metrics and random streams. Sinks and profilers are not
+# part of a snapshot, and neither are handlers registered with closures,
+# which cannot be pickled.
+class Snapshot:
+    def __init__(self, env: Environment):
+        self.clock = env.clock
+        self.state = pickle.dumps(env, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def at(env: Environment, time: float) -> Snapshot:
+        """Advance env to time and snapshot it there"""
+        env.simulate(until=time)
+        return Snapshot(env)
+
+    def restore(self, sink: EventSink = None) -> Environment:
+        """A new Environment in exactly the snapshotted state"""
+        env = pickle.loads(self.state)
+        if sink is not None:
+            env.sink = sink
+        return env
+
+    def fork(self,
+             n: int,
+             configs: Config | list[Config] = None,
+             seed: int = None) -> list[Environment]:
+        """
+        n independent branches continuing from the snapshot. Each branch gets
+        fresh random streams spawned from seed and, if given, its own config
+        (or all branches share one).
+        """
+        if isinstance(configs, Config) or configs is None:
+            configs = [configs] * n
+        if len(configs) != n:
+            raise ValueError(f"{len(configs)} configs for {n} branches")
+
+        branches = []
+        for config, rng in zip(configs, spawn_generators(seed, n)):
+            # Reseeded first, so that anything apply_config draws (such as
+            # the first failures of machines gaining breakdowns) comes from
+            # the branch's own streams
+            env = self.restore().reseed(rng)
+            if config is not None:
+                env.apply_config(config)
+            branches.append(env)
+        return branches
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as f:
+            f.write(self.state)
+
+    @staticmethod
+    def load(path: str) -> Snapshot:
+        snapshot = Snapshot.__new__(Snapshot)
+        with open(path, 'rb') as f:
+            snapshot.state = f.read()
+        snapshot.clock = pickle.loads(snapshot.state).clock
+        return snapshot
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import math
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate, islice
+from typing import Callable, Iterator
+
+import numpy as np
+
+
+# Hands out one variate at a time from blocks drawn in a single NumPy call.
+# Values are converted to Python scalars up front, which also keeps NumPy
+# scalar types out of the simulation clock.
+class BlockStream:
+    def __init__(self,
+                 draw: Callable[..., np.ndarray],
+                 *args,
+                 block: int = 4096):
+        # draw(*args, block) produces a block. Keeping the arguments here
+        # rather than in a closure lets streams be pickled and deep-copied.
+        self.__draw = draw
+        self.__args = args
+        self.__block = block
+        self.__values: Iterator = iter(())
+
+    def __refill(self) -> None:
+        self.__values = iter(
+            self.__draw(*self.__args, self.__block).tolist())
+
+    def __call__(self):
+        try:
+            return next(self.__values)
+        except StopIteration:
+            self.__refill()
+            return next(self.__values)
+
+    def take(self, n: int) -> list:
+        """The next n values, in the order __call__ would return them"""
+        values = list(islice(self.__values, n))
+        while len(values) < n:
+            self.__refill()
+            values.extend(islice(self.__values, n - len(values)))
+        return values
+
+
+@lru_cache(maxsize=64)
+def cumulative_weights(p: tuple[float, ...]) -> list[float]:
+    return list(accumulate(p))[:-1]
+
+
+# The scalar parts of the np.random.Generator API used by the simulation,
+# computed by inversion from unit uniforms. Sized draws go to a real
+# generator.
+class ScalarDraws:
+    def unit(self) -> float:
+        raise NotImplementedError
+
+    def generator(self) -> np.random.Generator:
+        raise NotImplementedError
+
+    def random(self, size=None):
+        if size is not None:
+            return self.generator().random(size)
+        return self.unit()
+
+    def uniform(self, low: float = 0.0, high: float = 1.0, size=None):
+        if size is not None:
+            return self.generator().uniform(low, high, size)
+        return low + (high - low) * self.unit()
+
+    def exponential(self, scale: float = 1.0, size=None):
+        if size is not None:
+            return self.generator().exponential(scale, size)
+        return -scale * math.log1p(-self.unit())
+
+    def integers(self, low: int, high: int, size=None):
+        if size is not None:
+            return self.generator().integers(low, high, size)
+        return low + int((high - low) * self.unit())
+
+    def choice(self, a: int, p=None) -> int:
+        """Index in range(a), weighted by p (which must sum to 1)"""
+        if p is None:
+            return self.integers(0, a)
+        return bisect_right(cumulative_weights(tuple(p)), self.unit())
+
+
+# Serves scalar draws from blocks of unit uniforms drawn from generator.
+# Reproducible for a seeded generator, but not draw-for-draw identical to
+# calling the generator directly.
+class BufferedGenerator(ScalarDraws):
+    def __init__(self, generator: np.random.Generator, block: int = 4096):
+        self.__generator = generator
+        self.unit = BlockStream(generator.random, block=block)
+
+    def generator(self) -> np.random.Generator:
+        return self.__generator
+
+    def take(self, n: int) -> list[float]:
+        return self.unit.take(n)
+
+    def seed_seq(self) -> np.random.SeedSequence:
+        return self.__generator.bit_generator.seed_seq
+
+
+# The draws one job makes for one purpose: a fixed number of unit uniforms
+# reserved for the job when it was created, then (for a job that outlives
+# them through repeated rework) a generator seeded from the job id and
+# purpose alone. Either way the draws do not depend on what other jobs did.
+class JobStream(ScalarDraws):
+    def __init__(self,
+                 values: array,
+                 seed_seq: np.random.SeedSequence,
+                 key: tuple[int, ...]):
+        self.__values = iter(values)
+        self.__seed_seq = seed_seq
+        self.__key = key
+        self.__generator = None
+
+    def generator(self) -> np.random.Generator:
+        if self.__generator is None:
+            ss = self.__seed_seq
+            self.__generator = np.random.default_rng(np.random.SeedSequence(
+                ss.entropy, spawn_key=ss.spawn_key + self.__key))
+        return self.__generator
+
+    def unit(self) -> float:
+        try:
+            return next(self.__values)
+        except StopIteration:
+            return self.generator().random()
+
+
+# The streams drawn from on behalf of a single job, one per purpose. All of
+# the job's reserved uniforms are held in one compact array, and a purpose's
+# stream is only built the first time the job draws from it, so jobs waiting
+# in a queue stay small.
+class JobStreams:
+    PURPOSES = ('setup', 'harvest', 'process', 'yield_noise', 'qc')
+    __slots__ = ('__values', '__seed_seq', '__job_id') + PURPOSES
+
+    def __init__(self,
+                 values: array,
+                 seed_seq: np.random.SeedSequence,
+                 job_id: int):
+        self.__values = values
+        self.__seed_seq = seed_seq
+        self.__job_id = job_id
+
+    def __getattr__(self, purpose: str) -> JobStream:
+        # Only reached for purposes whose stream has not been built yet
+        if purpose not in self.PURPOSES:
+            raise AttributeError(purpose)
+        index = self.PURPOSES.index(purpose)
+        n = len(self.__values) // len(self.PURPOSES)
+        stream = JobStream(self.__values[index * n:(index + 1) * n],
+                           self.__seed_seq, (index, self.__job_id))
+        setattr(self, purpose, stream)
+        return stream
+
+
+# Independent random streams derived from one generator: one for arrival
+# times, one for patient attributes, one from which each job reserves its
+# own setup, duration, yield and QC draws when it is created, and one for
+# machine failures and repairs. Given the
+# same generator, two simulations see the same arrivals and patients, and
+# each job sees the same draws however differently the configurations order
+# events. This gives common random numbers for paired comparisons.
+class RandomStreams:
+    PURPOSES = ['arrivals', 'patients', 'jobs', 'breakdowns']
+
+    def __init__(self,
+                 rng: np.random.Generator,
+                 block: int = 4096,
+                 job_draws: int = 8):
+        self.job_draws = job_draws
+        # Children are derived from the generator's seed sequence without
+        # spawning from it, so rng itself is left untouched and reusing it
+        # reproduces the same streams
+        ss = rng.bit_generator.seed_seq
+        self.purposes = {
+            purpose: BufferedGenerator(np.random.default_rng(
+                np.random.SeedSequence(ss.entropy,
+                                       spawn_key=ss.spawn_key + (k,))),
+                block)
+            for k, purpose in enumerate(self.PURPOSES)
+        }
+        self.arrivals = self.purposes['arrivals']
+        self.patients = self.purposes['patients']
+        self.jobs = self.purposes['jobs']
+        self.breakdowns = self.purposes['breakdowns']
+
+    def job(self, job_id: int) -> JobStreams:
+        """
+        Streams for job_id, each with job_draws reserved uniforms. Must be
+        called once per job, in job id order.
+        """
+        n = self.job_draws * len(JobStreams.PURPOSES)
+        return JobStreams(array('d', self.jobs.take(n)),
+                          self.jobs.seed_seq(), job_id)
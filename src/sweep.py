@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+
+from config import Config
+from replication import Replication, run_replication, spawn_generators
+
+
+# Bump whenever a model change makes cached results stale
+CACHE_VERSION = 2
+
+
+def grid(base: Config, axes: dict[str, list]) -> list[Config]:
+    """
+    Every combination of the values in axes applied to a copy of base. Keys
+    are Config attribute names, with dots for nested attributes, e.g.
+    'patient_config.patient_rates'. Each combination is built by
+    Config.from_dict, so values take the same forms as in a config file.
+    """
+    names = list(axes)
+    configs = []
+    for values in product(*(axes[name] for name in names)):
+        cell = base.to_dict()
+        for name, value in zip(names, values):
+            *path, attr = name.split('.')
+            target = cell
+            for part in path:
+                target = target.get(part) if isinstance(target, dict) \
+                    else None
+            if not isinstance(target, dict):
+                raise AttributeError(f"Config has no attribute {name}")
+            target[attr] = value
+        configs.append(Config.from_dict(cell))
+    return configs
+
+
+def config_hash(config: Config) -> str:
+    canonical = json.dumps(config.to_dict(), sort_keys=True,
+                           separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def cache_key(config_digest: str, seed: int, index: int) -> str:
+    return f"v{CACHE_VERSION}:{config_digest}:{seed}:{index}"
+
+
+# On-disk cache of replication results, keyed by config hash, root seed and
+# replication index. When a limit is exceeded the least recently used
+# entries are evicted.
+class ResultCache:
+    def __init__(self,
+                 path: str,
+                 max_entries: int = None,
+                 max_bytes: int = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'size INTEGER NOT NULL, last_access INTEGER NOT NULL)')
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS by_access ON results (last_access)')
+        self.db.commit()
+
+    def __len__(self) -> int:
+        return self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def size(self) -> int:
+        return self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def get(self, key: str) -> Replication:
+        row = self.db.execute(
+            'SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self.db.execute('UPDATE results SET last_access = ? WHERE key = ?',
+                        (time.time_ns(), key))
+        return Replication(**json.loads(row[0]))
+
+    def put(self, key: str, replication: Replication) -> None:
+        value = json.dumps(replication._asdict())
+        self.db.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+            (key, value, len(value), time.time_ns()))
+
+    def evict(self) -> None:
+        """Drop least recently used entries until within the limits"""
+        if self.max_entries is not None:
+            self.db.execute(
+                'DELETE FROM results WHERE key IN (SELECT key FROM results '
+                'ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,))
+        if self.max_bytes is not None:
+            excess = self.size() - self.max_bytes
+            rows = self.db.execute(
+                'SELECT key, size FROM results ORDER BY last_access')
+            doomed = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                doomed.append((key,))
+                excess -= size
+            self.db.executemany('DELETE FROM results WHERE key = ?', doomed)
+        self.db.commit()
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def close(self) -> None:
+        self.evict()
+        self.db.close()
+
+
+def run_sweep(configs: list[Config],
+              n: int,
+              workers: int = 1,
+              seed: int = None,
+              cache: ResultCache = None) -> list[list[Replication]]:
+    """
+    Run n replications of every config, reusing cached results and
+    scheduling the remaining (config, replication) tasks over a pool of
+    worker processes. Replication i of every config uses the same generator,
+    so the configs are compared under common random numbers.
+
+    Returns:
+    list[list[Replication]]: results[c][i] is replication i of configs[c].
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    rngs = spawn_generators(seed, n)
+    results = [[None] * n for _ in configs]
+
+    tasks = []
+    for c, config in enumerate(configs):
+        digest = config_hash(config)
+        for i in range(n):
+            key = cache_key(digest, seed, i)
+            cached = cache.get(key) if cache is not None else None
+            if cached is not None:
+                results[c][i] = cached
+            else:
+                tasks.append((c, i, key))
+
+    def store(task, replication: Replication) -> None:
+        c, i, key = task
+        results[c][i] = replication
+        if cache is not None:
+            cache.put(key, replication)
+
+    args = ([configs[c] for c, _, _ in tasks],
+            [i for _, i, _ in tasks],
+            [rngs[i] for _, i, _ in tasks])
+    if workers <= 1 or len(tasks) <= 1:
+        for task, replication in zip(tasks, map(run_replication, *args)):
+            store(task, replication)
+    else:
+        chunksize = max(1, len(tasks) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for task, replication in zip(
+                    tasks, pool.map(run_replication, *args,
+                                    chunksize=chunksize)):
+                store(task, replication)
+
+    if cache is not None:
+        cache.evict()
+    return results
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+
+from event import Event, EventType
+from sink import EventSink, participant_id
+
+
+class TraceError(Exception):
+    pass
+
+
+TRACE_VERSION = 1
+
+# One fixed-width file per column. Missing participants are stored as -1.
+TRACE_COLUMNS = {
+    'event_type': np.dtype('<u1'),
+    'time': np.dtype('<f8'),
+    'job': np.dtype('<i4'),
+    'machine': np.dtype('<i4'),
+    'operator': np.dtype('<i4'),
+}
+
+META_FILE = 'meta.json'
+
+
+def column_path(path: str, column: str) -> str:
+    return os.path.join(path, f"{column}.bin")
+
+
+# Columnar event trace. Events are buffered as rows and, once a chunk is
+# full, transposed and appended to each column file with a single write.
+# The trace is a directory; its metadata is only written on close, so an
+# unclosed trace is rejected by TraceReader.
+class TraceWriter(EventSink):
+    def __init__(self, path: str, chunk_events: int = 65536):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.chunk_events = chunk_events
+        self.count = 0
+        self.__rows = []
+        self.__files = {c: open(column_path(path, c), 'wb')
+                        for c in TRACE_COLUMNS}
+        # Stale metadata from an earlier trace must not describe this one
+        if os.path.exists(os.path.join(path, META_FILE)):
+            os.remove(os.path.join(path, META_FILE))
+
+    def emit(self, event: Event) -> None:
+        self.__rows.append((
+            event.event_type.value, event.time, participant_id(event.job),
+            participant_id(event.machine), participant_id(event.operator)))
+        if len(self.__rows) >= self.chunk_events:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.__rows:
+            return
+        n = len(self.__rows)
+        for column, values in zip(TRACE_COLUMNS, zip(*self.__rows)):
+            np.fromiter(values, dtype=TRACE_COLUMNS[column], count=n) \
+                .tofile(self.__files[column])
+        self.count += n
+        self.__rows.clear()
+
+    def close(self) -> None:
+        self.flush()
+        for f in self.__files.values():
+            f.close()
+        meta = {
+            'version': TRACE_VERSION,
+            'count': self.count,
+            'columns': {c: d.str for c, d in TRACE_COLUMNS.items()},
+            'event_types': {t.name: t.value for t in EventType},
+        }
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+
+# Memory-maps a trace written by TraceWriter. Columns are NumPy views onto the
+# files, so only the pages that are actually touched are read.
+class TraceReader:
+    def __init__(self, path: str):
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            raise TraceError(f"{path} is not a closed trace")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta['version'] != TRACE_VERSION:
+            raise TraceError(f"unsupported trace version {meta['version']}")
+
+        self.path = path
+        self.count = meta['count']
+        self.__columns = {}
+        for column, dtype in meta['columns'].items():
+            # np.memmap cannot map an empty file
+            if self.count == 0:
+                self.__columns[column] = np.empty(0, dtype=dtype)
+            else:
+                self.__columns[column] = np.memmap(
+                    column_path(path, column), dtype=dtype, mode='r',
+                    shape=(self.count,))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.__columns[column]
+
+    def mask(self,
+             event_type: EventType | int = None,
+             job: int = None,
+             machine: int = None,
+             operator: int = None) -> np.ndarray:
+        """Boolean mask of the events matching every given filter"""
+        if isinstance(event_type, EventType):
+            event_type = event_type.value
+        selected = np.ones(self.count, dtype=bool)
+        for column, value in [('event_type', event_type), ('job', job),
+                              ('machine', machine), ('operator', operator)]:
+            if value is not None:
+                selected &= self.__columns[column] == value
+        return selected
+
+    def select(self, **filters) -> dict[str, np.ndarray]:
+        """Columns of the events matching filters (see mask)"""
+        index = np.flatnonzero(self.mask(**filters))
+        return {c: v[index] for c, v in self.__columns.items()}
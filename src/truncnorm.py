@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+import numpy as np
+from scipy.special import ndtr, ndtri
+
+
+# Inverse-CDF sampler for a normal distribution truncated to standardized
+# bounds [a, b]. Constructing scipy.stats.truncnorm is expensive, so the
+# CDF values at the bounds are computed once here and reused for every draw.
+class TruncatedNormal:
+    def __init__(self, a: float, b: float):
+        if not a < b:
+            raise ValueError(f"empty truncation interval [{a}, {b}]")
+
+        # Inverting in the upper tail loses precision, so for an interval
+        # entirely above the mean we sample the mirrored interval instead
+        self.flip = a > 0
+        if self.flip:
+            a, b = -b, -a
+        self.a = a
+        self.b = b
+        self.mass = float(ndtr(b) - ndtr(a))
+        self.cdf_a = float(ndtr(a))
+        self.cdf_b = float(ndtr(b))
+
+    def standard(self, rng: np.random.Generator, size=None):
+        """Draw from the truncated standard normal"""
+        u = rng.uniform(self.cdf_a, self.cdf_b, size)
+        # Guard against u rounding onto a bound's CDF value and overshooting
+        z = np.clip(ndtri(u), self.a, self.b)
+        return -z if self.flip else z
+
+    def sample(self,
+               loc: float,
+               scale: float,
+               rng: np.random.Generator) -> float:
+        # Scalar path of standard(), avoiding array round trips
+        z = float(ndtri(rng.uniform(self.cdf_a, self.cdf_b)))
+        z = min(max(z, self.a), self.b)
+        return loc + scale * (-z if self.flip else z)
+
+    def sample_batch(self,
+                     loc: np.ndarray,
+                     scale: np.ndarray,
+                     rng: np.random.Generator,
+                     size: int = None) -> np.ndarray:
+        """
+        Draw many variates at once. loc and scale broadcast against each other
+        (and against size, if given).
+        """
+        if size is None:
+            size = np.broadcast(np.asarray(loc), np.asarray(scale)).shape
+        return loc + scale * self.standard(rng, size)
+
+    def partial_moments(self, z: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        P(Z <= z) and E[Z; Z <= z] for Z drawn from the truncated standard
+        normal, elementwise over z.
+        """
+        lower, upper = (-self.b, -self.a) if self.flip else (self.a, self.b)
+        z = np.clip(z, lower, upper)
+        cdf = (ndtr(z) - ndtr(lower)) / self.mass
+        partial_mean = (normal_pdf(lower) - normal_pdf(z)) / self.mass
+        return cdf, partial_mean
+
+
+def normal_pdf(z):
+    return np.exp(-0.5 * np.square(z)) / np.sqrt(2 * np.pi)
+
+
+@lru_cache(maxsize=128)
+def truncated_normal(a: float, b: float) -> TruncatedNormal:
+    """Shared sampler for the standardized bounds [a, b]"""
+    return TruncatedNormal(a, b)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import heapq
 from collections import deque
+from itertools import count
+from typing import Any, Callable, Iterator
 
 
 class QueueError(Exception):
@@ -9,6 +12,8 @@ class QueueError(Exception):
 
 # If in a queue, a queueable is queued
 class Queueable:
+    __slots__ = ('__queued',)
+
     def __init__(self):
         self.__queued = False
 
@@ -27,6 +32,8 @@ class Queue:
                  inverting: bool = False):
         self.inverting = inverting
         self.__buf = deque(init_elems)
+        for i in init_elems:
+            i.set_queued(not inverting)
 
     def peek(self) -> Queueable:
         if self.empty():
@@ -48,14 +55,76 @@ class Queue:
         popped.set_queued(self.inverting)
         return popped
 
+    def remove(self, i: Queueable) -> Queue:
+        """Take i out of the queue, wherever it is"""
+        self.__buf.remove(i)
+        i.set_queued(self.inverting)
+        return self
+
     def empty(self) -> bool:
         return len(self.__buf) == 0
 
+    def __len__(self) -> int:
+        return len(self.__buf)
+
+    # Queued elements in the order they will be popped
+    def __iter__(self) -> Iterator[Queueable]:
+        return iter(self.__buf)
+
     # debug only
     def getbuf(self) -> deque:
         return self.__buf
 
 
+# Drop-in replacement for Queue that pops the element with the lowest key
+# first, and elements with equal keys in the order they were pushed. Keys are
+# computed once, on push.
+class PriorityQueue:
+    def __init__(self,
+                 key: Callable[[Queueable], Any],
+                 init_elems: list[Queueable] = [],
+                 inverting: bool = False):
+        self.key = key
+        self.inverting = inverting
+        self.__seq = count()
+        self.__heap = []
+        for i in init_elems:
+            i.set_queued(not inverting)
+            self.__heap.append((key(i), next(self.__seq), i))
+        heapq.heapify(self.__heap)
+
+    def peek(self) -> Queueable:
+        if self.empty():
+            raise IndexError
+        return self.__heap[0][2]
+
+    def push(self, i: Queueable) -> PriorityQueue:
+        if i.queued():
+            raise QueueError
+
+        i.set_queued(not self.inverting)
+        heapq.heappush(self.__heap, (self.key(i), next(self.__seq), i))
+        return self
+
+    def pop(self) -> Queueable:
+        if self.empty():
+            return None
+        popped = heapq.heappop(self.__heap)[2]
+        popped.set_queued(self.inverting)
+        return popped
+
+    def empty(self) -> bool:
+        return not self.__heap
+
+    def __len__(self) -> int:
+        return len(self.__heap)
+
+    # Queued elements in the order they will be popped
+    def __iter__(self) -> Iterator[Queueable]:
+        return (entry[2] for entry in sorted(self.__heap,
+                                             key=lambda e: e[:2]))
+
+
 # Paired queue for Jobs, Machines, Operators (Queueables)
 class BusyQueue:
     def __init__(self, init_elems: list[Queueable] = []):
@@ -0,0 +1,105 @@
+"""
+Array versions of the yield model in Job.targets and Job.calculate_yield.
+Each function takes arrays of target blood counts, yield multipliers (the
+P_Type values) and process durations, broadcast against each other, and
+handles every element in one NumPy pass.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from config import Config
+from job import Patient, P_Type, YIELD_NOISE, YIELD_NOISE_OFFSET
+
+
+def patient_arrays(patients: list[Patient]) -> tuple[np.ndarray, np.ndarray]:
+    """Target blood counts and yield multipliers of patients"""
+    return (np.array([p.target_blood_count for p in patients], dtype=float),
+            multipliers([p.ptype for p in patients]))
+
+
+def multipliers(ptypes: list[P_Type]) -> np.ndarray:
+    return np.array([t.value for t in ptypes], dtype=float)
+
+
+def targets(target_bc: np.ndarray, config: Config) -> tuple:
+    target_low = target_bc / config.slope.low
+    target_high = target_low + config.delta_t
+    target_zero = target_high + target_bc / config.slope.high
+    return target_low, target_high, target_zero
+
+
+def deterministic_yield(duration: np.ndarray,
+                        target_bc: np.ndarray,
+                        config: Config) -> np.ndarray:
+    """Yield before noise: up the low slope, flat, then down the high slope"""
+    duration = np.asarray(duration, dtype=float)
+    target_bc = np.asarray(target_bc, dtype=float)
+    target_low, target_high, target_zero = targets(target_bc, config)
+    return np.select(
+        [duration <= target_low, duration <= target_high,
+         duration <= target_zero],
+        [config.slope.low * duration,
+         np.broadcast_to(target_bc, np.broadcast(duration, target_bc).shape),
+         target_bc - config.slope.high * (duration - target_high)],
+        0.0)
+
+
+def calculate_yield(duration: np.ndarray,
+                    target_bc: np.ndarray,
+                    multiplier: np.ndarray,
+                    config: Config,
+                    rng: np.random.Generator) -> np.ndarray:
+    """Job.calculate_yield, elementwise, with one noise draw per element"""
+    duration, target_bc, multiplier = np.broadcast_arrays(
+        np.asarray(duration, dtype=float), np.asarray(target_bc, dtype=float),
+        np.asarray(multiplier, dtype=float))
+    p_yield = deterministic_yield(duration, target_bc, config)
+
+    noisy = p_yield > 0
+    sigma = config.yield_standard_deviation
+    p_yield[noisy] = YIELD_NOISE.sample_batch(
+        p_yield[noisy] + YIELD_NOISE_OFFSET * sigma, sigma, rng)
+
+    p_yield *= multiplier
+    return np.where(p_yield <= target_bc, p_yield / target_bc, 1.0)
+
+
+def expected_yield(duration: np.ndarray,
+                   target_bc: np.ndarray,
+                   multiplier: np.ndarray,
+                   config: Config) -> np.ndarray:
+    """
+    Mean of calculate_yield over the noise, computed exactly. The noisy
+    yield X is capped once multiplier * X exceeds the target, so
+    E[min(k X, 1)] = k E[X; X <= 1/k] + P(X > 1/k), with k = multiplier /
+    target_bc, from the partial moments of the truncated normal.
+    """
+    p_yield = deterministic_yield(duration, target_bc, config)
+    k = np.asarray(multiplier, dtype=float) / np.asarray(target_bc, dtype=float)
+
+    sigma = config.yield_standard_deviation
+    mu = p_yield + YIELD_NOISE_OFFSET * sigma
+    with np.errstate(divide='ignore'):
+        cap = (1 / k - mu) / sigma
+    below, partial_mean = YIELD_NOISE.partial_moments(cap)
+    expected = k * (mu * below + sigma * partial_mean) + (1 - below)
+    return np.where(p_yield > 0, expected, 0.0)
+
+
+def expected_yield_curve(durations: np.ndarray,
+                         target_bc: np.ndarray,
+                         multiplier: np.ndarray,
+                         config: Config) -> np.ndarray:
+    """
+    Expected yield of every patient at every duration on a grid.
+
+    Returns:
+    np.ndarray: curve[i, j] is the expected yield of patient i processed for
+    durations[j].
+    """
+    target_bc = np.atleast_1d(np.asarray(target_bc, dtype=float))
+    multiplier = np.broadcast_to(multiplier, target_bc.shape)
+    return expected_yield(np.asarray(durations, dtype=float)[np.newaxis, :],
+                          target_bc[:, np.newaxis],
+                          multiplier[:, np.newaxis], config)
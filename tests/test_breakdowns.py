@@ -0,0 +1,70 @@
+import copy
+
+import numpy as np
+import pytest
+
+from config import Config, Reliability
+from environment import Environment
+from event import EventType
+from machine import HarvestMachine, ProcessMachine
+from snapshot import Snapshot
+
+
+def breakdown_config() -> Config:
+    config = Config()
+    config.patient_count = None
+    config.simulation_time = 4000
+    config.harvest_machine_count = 32
+    config.process_machine_count = 64
+    config.harvest_machine_reliability = Reliability(100, 5)
+    config.process_machine_reliability = Reliability(100, 5)
+    return config
+
+
+def failure_times(env: Environment) -> list[float]:
+    return sorted(e.time for e in env.pending_events
+                  if e.event_type == EventType.MACHINE_FAILURE)
+
+
+@pytest.mark.parametrize('kind', [HarvestMachine, ProcessMachine])
+def test_failures_per_machine_match_renewal_rate(kind):
+    # Up and repair times alternate, so each machine fails about
+    # simulation_time / (mtbf + mttr) times, idle or in service
+    config = breakdown_config()
+    env = Environment(config, np.random.default_rng(1))
+    failures = {}
+    handler = env.handlers[EventType.MACHINE_FAILURE]
+
+    def counting_handler(event):
+        failures[event.machine] = failures.get(event.machine, 0) + 1
+        handler(event)
+
+    env.register_handler(EventType.MACHINE_FAILURE, counting_handler)
+    env.simulate()
+
+    counts = [n for machine, n in failures.items()
+              if isinstance(machine, kind)]
+    machine_count = config.harvest_machine_count if kind is HarvestMachine \
+        else config.process_machine_count
+    assert len(counts) == machine_count
+    expected = config.simulation_time / (100 + 5)
+    assert np.mean(counts) / expected == pytest.approx(1, abs=0.1)
+    assert min(counts) > expected / 2
+
+
+def test_forks_enabling_breakdowns_draw_from_their_own_streams():
+    config = Config()
+    config.patient_count = None
+    env = Environment(config, np.random.default_rng(0))
+    snapshot = Snapshot.at(env, 1000)
+    reliable = copy.deepcopy(config)
+    reliable.harvest_machine_reliability = Reliability(50, 5)
+
+    times = [tuple(failure_times(branch))
+             for seed in [1, 2]
+             for branch in snapshot.fork(3, reliable, seed=seed)]
+    assert all(len(t) == config.harvest_machine_count for t in times)
+    assert len(set(times)) == len(times)
+    again = [tuple(failure_times(branch))
+             for branch in snapshot.fork(3, reliable, seed=1)]
+    assert again == times[:3]
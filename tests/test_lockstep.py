@@ -0,0 +1,22 @@
+from config import Config
+from lockstep import KPIS, equivalence_test
+
+
+def test_lockstep_matches_reference_engine():
+    # Eight tests at a fixed seed; only a real difference between the
+    # engines should push a p-value this low
+    result = equivalence_test(Config(), 100, seed=0)
+    assert set(result) == set(KPIS)
+    for kpi, test in result.items():
+        assert test['t_pvalue'] > 1e-3, kpi
+        assert test['ks_pvalue'] > 1e-3, kpi
+
+
+def test_lockstep_matches_reference_engine_without_cohort_limit():
+    config = Config()
+    config.patient_count = None
+    config.simulation_time = 1000
+    result = equivalence_test(config, 50, seed=0)
+    for kpi, test in result.items():
+        assert test['t_pvalue'] > 1e-3, kpi
+        assert test['ks_pvalue'] > 1e-3, kpi
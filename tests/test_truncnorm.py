@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from truncnorm import TruncatedNormal, truncated_normal
+
+
+# The yield noise interval, intervals wholly below and wholly above the
+# mean, one reaching far into the upper tail, and one straddling the mean.
+# Those above the mean are sampled mirrored.
+INTERVALS = [(-0.84, 0.84), (-3.0, -1.0), (0.5, 2.5), (1.0, 6.0),
+             (-1.0, 4.0)]
+
+
+@pytest.mark.parametrize('a, b', INTERVALS)
+def test_standard_matches_scipy(a, b):
+    sampler = TruncatedNormal(a, b)
+    assert sampler.flip == (a > 0)
+    z = sampler.standard(np.random.default_rng(0), 20000)
+    assert a <= z.min() and z.max() <= b
+    assert stats.kstest(z, stats.truncnorm(a, b).cdf).pvalue > 1e-3
+
+
+@pytest.mark.parametrize('a, b', INTERVALS)
+def test_sample_matches_scipy(a, b):
+    sampler = TruncatedNormal(a, b)
+    rng = np.random.default_rng(1)
+    x = np.array([sampler.sample(10.0, 2.0, rng) for _ in range(5000)])
+    reference = stats.truncnorm(a, b, loc=10.0, scale=2.0)
+    assert stats.kstest(x, reference.cdf).pvalue > 1e-3
+
+
+def test_sample_batch_broadcasts_loc_and_scale():
+    sampler = truncated_normal(-0.84, 0.84)
+    loc = np.array([0.0, 100.0])
+    x = sampler.sample_batch(loc[:, np.newaxis], 3.0,
+                             np.random.default_rng(2), (2, 10000))
+    for row, mu in zip(x, loc):
+        reference = stats.truncnorm(-0.84, 0.84, loc=mu, scale=3.0)
+        assert stats.kstest(row, reference.cdf).pvalue > 1e-3
+
+
+@pytest.mark.parametrize('a, b', INTERVALS)
+def test_partial_moments_match_scipy(a, b):
+    sampler = TruncatedNormal(a, b)
+    reference = stats.truncnorm(a, b)
+    z = np.linspace(a - 0.5, b + 0.5, 7)
+    cdf, partial_mean = sampler.partial_moments(z)
+    assert cdf == pytest.approx(reference.cdf(z))
+    expected = [reference.expect(lambda x: x, lb=a, ub=min(max(t, a), b))
+                if t > a else 0.0 for t in z]
+    assert partial_mean == pytest.approx(expected, abs=1e-9)
+
+
+def test_empty_interval_is_rejected():
+    with pytest.raises(ValueError):
+        TruncatedNormal(1.0, 1.0)
+
+
+def test_samplers_are_shared_by_bounds():
+    assert truncated_normal(-0.84, 0.84) is truncated_normal(-0.84, 0.84)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from config import Config, PatientConfig
+from job import Job, Patient, P_GENDERS, P_TYPES
+from yield_model import calculate_yield, expected_yield, \
+    expected_yield_curve, patient_arrays, targets
+
+
+DRAWS = 4000
+
+
+@pytest.fixture
+def patients() -> list[Patient]:
+    rng = np.random.default_rng(0)
+    return [Patient(gender, ptype, PatientConfig(), rng)
+            for gender in P_GENDERS for ptype in P_TYPES]
+
+
+def durations(patient: Patient, config: Config) -> np.ndarray:
+    """A duration in every band of the yield curve, and one past it"""
+    low, high, zero = Job(patient, 0).targets(config)
+    return np.array([low / 2, (low + high) / 2, (high + zero) / 2, zero + 1])
+
+
+def test_targets_match_job(patients):
+    config = Config()
+    target_bc, _ = patient_arrays(patients)
+    for i, bounds in enumerate(zip(*targets(target_bc, config))):
+        assert bounds == pytest.approx(Job(patients[i], i).targets(config))
+
+
+# The default noise is tiny next to target blood counts; the larger one
+# makes noise, and the cap at the target, matter
+@pytest.mark.parametrize('sigma', [0.7, 1e5])
+def test_scalar_vector_and_closed_form_agree(patients, sigma):
+    config = Config()
+    config.yield_standard_deviation = sigma
+    rng = np.random.default_rng(1)
+    target_bc, multiplier = patient_arrays(patients)
+    for i, patient in enumerate(patients):
+        job = Job(patient, i)
+        for duration in durations(patient, config):
+            expected = expected_yield(duration, target_bc[i], multiplier[i],
+                                      config)
+            scalar = np.array([job.calculate_yield(duration, config, rng)
+                               for _ in range(DRAWS)])
+            vector = calculate_yield(np.full(DRAWS, duration), target_bc[i],
+                                     multiplier[i], config, rng)
+            for draws in [scalar, vector]:
+                se = draws.std() / np.sqrt(DRAWS)
+                assert abs(draws.mean() - expected) <= 4 * se + 1e-12
+
+
+def test_yield_is_zero_past_target_zero(patients):
+    config = Config()
+    target_bc, multiplier = patient_arrays(patients)
+    past = np.array([durations(p, config)[-1] for p in patients])
+    assert not calculate_yield(past, target_bc, multiplier, config,
+                               np.random.default_rng(2)).any()
+    assert not expected_yield(past, target_bc, multiplier, config).any()
+
+
+def test_expected_yield_curve_rows_are_patients(patients):
+    config = Config()
+    target_bc, multiplier = patient_arrays(patients)
+    grid = np.linspace(0, 40, 9)
+    curve = expected_yield_curve(grid, target_bc, multiplier, config)
+    assert curve.shape == (len(patients), len(grid))
+    for i in range(len(patients)):
+        assert curve[i] == pytest.approx(
+            expected_yield(grid, target_bc[i], multiplier[i], config))